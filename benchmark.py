@@ -0,0 +1,286 @@
+"""
+Benchmarks for the main operations of venv_cli, built on the workspaces used by the tests.
+
+Run `python benchmark.py --help' from the repository root for usage.
+"""
+
+import os, sys, io, time, json, platform, argparse, contextlib, statistics
+
+from tests.helpers import workspace
+from venv_cli.timings import percentile
+
+
+def _time(ws, *lines):
+	start = time.perf_counter()
+	ws.run(*lines)
+	
+	return time.perf_counter() - start
+
+
+def bench_cold_create():
+	"""
+	Create a virtualenv with an empty template cache.
+	"""
+	
+	with workspace() as ws:
+		return _time(ws, 'venv --no-activate')
+
+
+def bench_cold_create_no_cache():
+	"""
+	Create a virtualenv by running virtualenv.
+	"""
+	
+	with workspace() as ws:
+		return _time(ws, 'venv --no-activate --no-cache')
+
+
+def bench_cold_create_stdlib():
+	"""
+	Create a virtualenv using the venv module of the standard library within the running process.
+	"""
+	
+	with workspace() as ws:
+		return _time(ws, 'venv --no-activate --no-cache --engine stdlib')
+
+
+def bench_warm_recreate():
+	"""
+	Recreate an existing virtualenv with a filled template cache.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		return _time(ws, 'venv --recreate --no-activate')
+
+
+def bench_setup():
+	"""
+	Recreate and set up a virtualenv for a project with a filled template cache.
+	"""
+	
+	with workspace(virtualenvs = ['venv'], dummy_project = True) as ws:
+		return _time(ws, 'venv --setup --no-activate')
+
+
+def bench_setup_dependencies():
+	"""
+	Recreate and set up a virtualenv for a project with a dependency whose installation has been cached as a snapshot.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.create_dir('dependency')
+		ws.create_file('dependency/setup.py', 'import setuptools\nsetuptools.setup(name = "venv_cli_dependency", py_modules = ["venv_cli_dependency"])\n')
+		ws.create_file('dependency/venv_cli_dependency.py', '')
+		ws.create_file('setup.py', 'import setuptools\nsetuptools.setup(name = "venv_cli_dummy", py_modules = [], install_requires = ["venv_cli_dependency"])\n')
+		ws.run(
+			'venv/bin/pip wheel --quiet --no-build-isolation --no-deps --wheel-dir packages ./dependency',
+			'venv --setup --no-activate --find-links packages')
+		
+		return _time(ws, 'venv --setup --no-activate --find-links packages')
+
+
+def bench_pool_create():
+	"""
+	Create a virtualenv by claiming a spare virtualenv from the pool daemon.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --pool-daemon > /dev/null 2>&1 & echo $! > daemon.pid',
+			'for i in $(seq 600); do venv --pool-status 2> /dev/null | grep -q " 1/" && break; sleep 0.1; done')
+		
+		try:
+			return _time(ws, 'venv --no-activate')
+		finally:
+			ws.run('kill $(cat daemon.pid)')
+
+
+def bench_export():
+	"""
+	Export a virtualenv to a compressed archive.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		return _time(ws, 'venv --export venv.tgz')
+
+
+def bench_import():
+	"""
+	Import a virtualenv from a compressed archive at a different path.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run('venv --export venv.tgz')
+		
+		return _time(ws, 'venv --no-activate --import venv.tgz venv2')
+
+
+def bench_clone():
+	"""
+	Clone an existing virtualenv to a different path.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		return _time(ws, 'venv --no-activate --clone venv venv2')
+
+
+def bench_test():
+	"""
+	Test an existing virtualenv.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		return _time(ws, 'venv --test')
+
+
+def bench_test_deep():
+	"""
+	Test an existing virtualenv including its base interpreter.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		return _time(ws, 'venv --test --deep')
+
+
+def bench_activate():
+	"""
+	Time until the shell started by activating an existing virtualenv runs its first command.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		return _time(ws, 'venv', 'true')
+
+
+def bench_exec():
+	"""
+	Run a command in an existing virtualenv without starting a shell.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		return _time(ws, 'venv exec -- true')
+
+
+def bench_shell_init_activate():
+	"""
+	Activate an existing virtualenv in the current shell using the shell function printed by --shell-init.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		return _time(ws, 'eval "$(venv --shell-init)"', 'venv')
+
+
+def bench_list_pythons():
+	"""
+	List the available interpreters with a filled registry cache.
+	"""
+	
+	with workspace() as ws:
+		ws.run('venv --list-pythons')
+		
+		return _time(ws, 'venv --list-pythons')
+
+
+def bench_dedup():
+	"""
+	Deduplicate two virtualenvs whose files are already shared, which only needs to stat them.
+	"""
+	
+	with workspace(virtualenvs = ['venv', 'venv2']) as ws:
+		ws.run('venv --dedup .')
+		
+		return _time(ws, 'venv --dedup .')
+
+
+benchmarks = { i[len('bench_'):]: j for i, j in sorted(globals().items()) if i.startswith('bench_') }
+
+
+@contextlib.contextmanager
+def _silenced(verbose):
+	if verbose:
+		yield
+	else:
+		with open(os.devnull, 'wb') as devnull:
+			stream = io.TextIOWrapper(devnull)
+			
+			with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+				yield
+
+
+def run_benchmarks(names : list, repeat : int, verbose : bool):
+	results = { }
+	
+	for name in names:
+		durations = []
+		
+		for i in range(repeat):
+			with _silenced(verbose):
+				durations.append(benchmarks[name]())
+		
+		results[name] = dict(
+			durations = durations,
+			median = statistics.median(durations),
+			p95 = percentile(durations, 0.95))
+		
+		print('{:<24} median {:8.3f} s, p95 {:8.3f} s'.format(name, results[name]['median'], results[name]['p95']), file = sys.stderr)
+	
+	return results
+
+
+def compare_results(results : dict, baseline : dict, threshold : float):
+	"""
+	Print a comparison of the medians in results and baseline. Returns the names of the benchmarks which are slower than the baseline by more than the specified fraction.
+	"""
+	
+	regressions = []
+	
+	for name, result in sorted(results.items()):
+		if name not in baseline:
+			continue
+		
+		ratio = result['median'] / baseline[name]['median']
+		regressed = ratio > 1 + threshold
+		
+		if regressed:
+			regressions.append(name)
+		
+		print('{:<24} {:8.3f} s -> {:8.3f} s ({:+.0%}){}'.format(name, baseline[name]['median'], result['median'], ratio - 1, ' REGRESSION' if regressed else ''), file = sys.stderr)
+	
+	return regressions
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description = 'Run benchmarks of venv_cli. The `venv\' command must be on the PATH.')
+	
+	parser.add_argument('-n', '--repeat', type = int, default = 5, help = 'Number of times each benchmark is run. Defaults to 5.')
+	parser.add_argument('-o', '--output', type = str, default = None, metavar = 'FILE', help = 'Write the results to this JSON file.')
+	parser.add_argument('-c', '--compare', type = str, default = None, metavar = 'FILE', help = 'Compare the results with a JSON file written by an earlier run and exit with status 1 if any benchmark regressed.')
+	parser.add_argument('-t', '--threshold', type = float, default = 0.2, help = 'Fraction by which the median of a benchmark may be slower than the baseline before it is considered a regression. Defaults to 0.2.')
+	parser.add_argument('-v', '--verbose', action = 'store_true', help = 'Show the output of the benchmarked commands.')
+	parser.add_argument('names', nargs = '*', metavar = 'benchmark', help = 'Benchmarks to run, any of {}. Defaults to all.'.format(', '.join(sorted(benchmarks))))
+	
+	args = parser.parse_args()
+	
+	for i in args.names:
+		if i not in benchmarks:
+			parser.error('Unknown benchmark: {}'.format(i))
+	
+	return args
+
+
+def main(repeat : int, output : str, compare : str, threshold : float, verbose : bool, names : list):
+	results = run_benchmarks(names or sorted(benchmarks), repeat, verbose)
+	
+	if output is not None:
+		with open(output, 'w', encoding = 'utf-8') as file:
+			json.dump(dict(python = platform.python_version(), time = time.time(), results = results), file, indent = 1, sort_keys = True)
+	
+	if compare is not None:
+		with open(compare, 'r', encoding = 'utf-8') as file:
+			baseline = json.load(file)['results']
+		
+		if compare_results(results, baseline, threshold):
+			sys.exit(1)
+
+
+if __name__ == '__main__':
+	main(**vars(parse_args()))
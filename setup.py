@@ -5,6 +5,7 @@ setuptools.setup(
 	name = 'venv_cli',
 	version = '0.1',
 	packages = setuptools.find_packages(),
+	python_requires = '>=3.8',
 	install_requires = [],
 	entry_points = dict(
 		console_scripts = [
@@ -0,0 +1,8 @@
+import pytest
+from . import helpers
+
+
+@pytest.fixture(scope = 'session', autouse = True)
+def prebuilt_virtualenvs():
+	with helpers.prebuilt_virtualenvs():
+		yield
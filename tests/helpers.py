@@ -1,4 +1,5 @@
-import os, subprocess, sys, contextlib, pkgutil, tempfile, pytest
+import os, re, subprocess, sys, contextlib, pkgutil, selectors, tempfile, pytest
+from venv_cli.relocate import find_references, clone_tree
 
 
 class RunResult:
@@ -8,42 +9,151 @@ class RunResult:
 		self.stderr = stderr
 
 
+# Options which keep the venv command from starting a new shell.
+_non_activating_options = { '-n', '--no-activate', '-t', '--test', '-m', '--matrix', '--export', '--list-cache', '--purge-cache', '--scan', '--gc', '--dedup', '--pool-daemon', '--pool-status', '--list-pythons', '--stats', '--shell-init', '-h', '--help' }
+
+
+def _may_start_shell(line : str):
+	"""
+	Return whether running the line may replace the shell with a new one which reads the following lines. The venv command does this when it activates a virtualenv.
+	"""
+	
+	words = line.split()
+	
+	return words[:1] == ['venv'] and words[1:2] != ['exec'] and not _non_activating_options & set(words)
+
+
 class Workspace:
 	"""
 	Allows executing commands and checking conditions in a temporary directory.
+	
+	Commands are run by a bash process which is kept running for the lifetime of the workspace. Each call to run() is executed in a subshell of it, so that changes to the environment, the working directory or traps do not leak into the next call. Its output and exit status are framed by markers.
 	"""
 	
 	def __init__(self, dir):
 		self.cwd = os.path.join(dir, 'cwd')
 		self.home = os.path.join(dir, 'home')
+		self._session = None
 		
 		os.mkdir(self.cwd)
 		os.mkdir(self.home)
 	
-	def _run_commands(self, lines):
+	def _start_bash(self):
 		environ = dict(os.environ)
 		environ['HOME'] = os.path.abspath(self.home)
 		
-		process = subprocess.Popen(
+		# Keep caches used by venv_cli within the workspace.
+		for i in 'XDG_CACHE_HOME', 'VENV_CLI_CACHE_DIR':
+			environ.pop(i, None)
+		
+		# Otherwise virtualenv starts a background process which writes to the workspace after the command has finished.
+		environ['VIRTUALENV_NO_PERIODIC_UPDATE'] = '1'
+		
+		return subprocess.Popen(
 			['bash'],
 			cwd = self.cwd,
 			stdin = subprocess.PIPE,
 			stdout = subprocess.PIPE,
 			stderr = subprocess.PIPE,
 			env = environ)
+	
+	def _run_isolated(self, lines):
+		"""
+		Run the lines by piping them into a new bash process, so that they can be read by a shell started by one of them.
+		"""
 		
+		process = self._start_bash()
 		input = ''.join(i + '\n' for i in lines).encode()
 		out, err = process.communicate(input)
 		
+		return process.returncode, out, err
+	
+	def _read_frames(self, patterns : dict):
+		"""
+		Read from the output streams of the bash process until each of them contains a frame matched by the corresponding pattern and return the matches. Anything written before the frame, e.g. by background processes of previous calls, is ignored.
+		"""
+		
+		buffers = { i: b'' for i in patterns }
+		matches = { }
+		
+		with selectors.DefaultSelector() as selector:
+			for i in patterns:
+				selector.register(i, selectors.EVENT_READ)
+			
+			while len(matches) < len(patterns):
+				for key, _ in selector.select():
+					data = os.read(key.fd, 1 << 16)
+					
+					if not data:
+						raise RuntimeError('The bash process of the workspace exited unexpectedly.')
+					
+					buffers[key.fileobj] += data
+					match = patterns[key.fileobj].search(buffers[key.fileobj])
+					
+					if match is not None:
+						matches[key.fileobj] = match
+						selector.unregister(key.fileobj)
+		
+		return matches
+	
+	def _run_in_session(self, lines):
+		"""
+		Run the lines in a subshell of the bash process of this workspace, which is started if necessary.
+		"""
+		
+		if self._session is None:
+			self._session = self._start_bash()
+		
+		marker = 'venv_cli_frame_{}'.format(os.urandom(8).hex())
+		
+		# The script is passed through a quoted here-document, so that it is not expanded before it is evaluated. Its stdin is redirected, so that it cannot read the following requests.
+		request_lines = [
+			"IFS= read -r -d '' venv_cli_script << '{}'".format(marker),
+			*lines,
+			marker,
+			"printf '%s\\n' '{0} begin'; printf '%s\\n' '{0} begin' >&2".format(marker),
+			'( eval "$venv_cli_script" ) < /dev/null',
+			"printf '\\n%s %s\\n' '{0} end' $?; printf '\\n%s\\n' '{0} end' >&2".format(marker)]
+		
+		self._session.stdin.write(''.join(i + '\n' for i in request_lines).encode())
+		self._session.stdin.flush()
+		
+		marker = re.escape(marker.encode())
+		matches = self._read_frames({
+			self._session.stdout: re.compile(marker + rb' begin\n(.*?)\n' + marker + rb' end (\d+)\n', re.DOTALL),
+			self._session.stderr: re.compile(marker + rb' begin\n(.*?)\n' + marker + rb' end\n', re.DOTALL) })
+		
+		out_match = matches[self._session.stdout]
+		
+		return int(out_match.group(2)), out_match.group(1), matches[self._session.stderr].group(1)
+	
+	def _run_commands(self, lines):
+		if any(_may_start_shell(i) for i in lines):
+			returncode, out, err = self._run_isolated(lines)
+		else:
+			returncode, out, err = self._run_in_session(lines)
+		
 		sys.stdout.buffer.write(out)
 		sys.stderr.buffer.write(err)
 		
 		# We expect all output to be valid UTF-8, mainly because all output should be ASCII.
-		return RunResult(process.returncode, out.decode(), err.decode())
+		return RunResult(returncode, out.decode(), err.decode())
+	
+	def close(self):
+		"""
+		Terminate the bash process of the workspace. Background processes started by commands are left running.
+		"""
+		
+		if self._session is not None:
+			self._session.stdin.close()
+			self._session.wait()
+			self._session.stdout.close()
+			self._session.stderr.close()
+			self._session = None
 	
 	def run(self, *lines, expect_error = False, expect_stdout_contains = '', expect_stderr_contains = ''):
 		"""
-		Runs the specified commands by piping them into a non-interactive bash process.
+		Runs the specified commands in a non-interactive bash process.
 		"""
 		
 		def iter_lines():
@@ -123,6 +233,62 @@ class Workspace:
 			assert found_files == set(files)
 
 
+# Directory in which virtualenvs are built once per session by prebuilt_virtualenvs(). None outside of such a session.
+_prebuilt_dir = None
+_prebuilt_virtualenvs = { }
+
+
+class _PrebuiltVirtualenv:
+	def __init__(self, path):
+		self.path = path
+		self.references = find_references(path, [path])
+	
+	def copy_to(self, path):
+		clone_tree(self.path, path, [(self.path, path)], self.references, allow_hardlinks = True)
+
+
+@contextlib.contextmanager
+def prebuilt_virtualenvs():
+	"""
+	Within this context, virtualenvs requested from workspace() are only built once and then copied into each workspace. Each process uses its own directory, so that tests can be run in parallel.
+	"""
+	
+	global _prebuilt_dir
+	
+	with tempfile.TemporaryDirectory(prefix = 'venv_cli_prebuilt-') as temp_dir:
+		_prebuilt_dir = temp_dir
+		
+		try:
+			yield
+		finally:
+			_prebuilt_dir = None
+			_prebuilt_virtualenvs.clear()
+
+
+def _add_virtualenv(ws, path):
+	if _prebuilt_dir is None:
+		ws.run('venv --no-activate {}'.format(path))
+	else:
+		prebuilt = _prebuilt_virtualenvs.get(path)
+		
+		if prebuilt is None:
+			# The prompt of the virtualenv depends on the name of its parent directory, which is the same as in the workspace.
+			prebuilt_dir = os.path.join(_prebuilt_dir, str(len(_prebuilt_virtualenvs)))
+			os.mkdir(prebuilt_dir)
+			
+			prebuilt_ws = Workspace(prebuilt_dir)
+			
+			try:
+				prebuilt_ws.run('venv --no-activate {}'.format(path))
+			finally:
+				prebuilt_ws.close()
+			
+			prebuilt = _PrebuiltVirtualenv(os.path.join(prebuilt_ws.cwd, path))
+			_prebuilt_virtualenvs[path] = prebuilt
+		
+		prebuilt.copy_to(os.path.join(ws.cwd, path))
+
+
 @contextlib.contextmanager
 def workspace(*, virtualenvs = [], dummy_project = False):
 	with tempfile.TemporaryDirectory() as temp_dir:
@@ -134,7 +300,10 @@ def workspace(*, virtualenvs = [], dummy_project = False):
 				
 				ws.create_file(i, data)
 		
-		for i in virtualenvs:
-			ws.run('venv --no-activate {}'.format(i))
-		
-		yield ws
+		try:
+			for i in virtualenvs:
+				_add_virtualenv(ws, i)
+			
+			yield ws
+		finally:
+			ws.close()
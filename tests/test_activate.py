@@ -31,3 +31,34 @@ def test_pyenv_launcher_not_exported():
 		ws.run(
 			'venv',
 			'! [ "$__PYVENV_LAUNCHER__" ]')
+
+
+_startup_script = '''
+import os, sys
+
+before = set(sys.modules)
+
+import venv_cli
+
+def execvpe(*args):
+	print(' '.join(set(sys.modules) - before))
+	os._exit(0)
+
+# Stop right before the shell would be started.
+os.execvpe = execvpe
+sys.argv = ['venv']
+venv_cli.script_main()
+'''
+
+
+def test_activate_startup():
+	"""
+	Check that activating an existing virtualenv does not import modules which are only needed for other operations. How long activating takes is measured by the benchmark `activate'.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.create_file('startup.py', _startup_script)
+		
+		modules = ws.run('python startup.py').stdout.split()
+		
+		assert not set(modules) & { 'argparse', 'subprocess', 'shutil', 'tempfile' }
@@ -0,0 +1,87 @@
+from .helpers import *
+
+
+def test_export_import():
+	"""
+	Test whether a virtualenv imported at a different path refers to that path and works.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.create_dir('other')
+		ws.run(
+			'venv --export venv.tgz',
+			'venv -n --import venv.tgz other/venv',
+			'[ -z "$(grep -rl "$PWD/venv" other/venv/bin other/venv/pyvenv.cfg)" ]')
+		
+		ws.check_venv('other/venv')
+		ws.run(
+			'venv other/venv',
+			'[ "$VIRTUAL_ENV" = "$PWD/other/venv" ]',
+			'pip --version',
+			expect_stdout_contains = os.path.join('other', 'venv', 'lib'))
+
+
+def test_export_import_pipe():
+	"""
+	Test whether an archive can be written to stdout and read from stdin, and whether importing replaces an existing virtualenv.
+	"""
+	
+	with workspace(virtualenvs = ['venv', 'venv2']) as ws:
+		ws.run(
+			'touch venv/marker',
+			'venv --export - venv | venv -n --import - venv2',
+			'[ -e venv2/marker ]')
+
+
+def test_export_compression():
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv --export venv.tar.xz',
+			'tar -tJf venv.tar.xz manifest.json',
+			'venv -n --import venv.tar.xz venv2')
+		
+		ws.check_venv('venv2')
+
+
+def test_export_not_virtualenv():
+	with workspace() as ws:
+		ws.create_dir('venv')
+		ws.run(
+			'venv --export venv.tgz',
+			expect_error = True,
+			expect_stderr_contains = 'venv is not a virtualenv')
+		
+		ws.check_file('venv.tgz', exists = False)
+
+
+def test_import_invalid():
+	"""
+	Test whether an existing virtualenv is restored if importing an archive fails.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'mkdir dir',
+			'touch dir/file',
+			'tar -czf dir.tgz dir')
+		
+		ws.run(
+			'venv -n --import dir.tgz',
+			expect_error = True,
+			expect_stderr_contains = 'dir.tgz contains an unexpected member dir')
+		
+		ws.run(
+			'venv -n --import missing.tgz',
+			expect_error = True,
+			expect_stderr_contains = 'Importing missing.tgz failed')
+		
+		ws.check_venv()
+		ws.check_dir(['venv', 'dir'], ['dir.tgz'])
+
+
+def test_import_conflicts():
+	with workspace() as ws:
+		ws.run(
+			'venv --recreate --import venv.tgz',
+			expect_error = True,
+			expect_stderr_contains = '--import conflicts with')
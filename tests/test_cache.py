@@ -0,0 +1,109 @@
+from .helpers import *
+
+
+def test_create_from_cache():
+	"""
+	Test whether a virtualenv copied from a cached template refers to its own path.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv --no-activate venv2')
+		
+		ws.check_venv('venv2')
+		ws.run(
+			'venv venv2',
+			'[ "$VIRTUAL_ENV" = "$PWD/venv2" ]',
+			'[ "$(which python)" = "$PWD/venv2/bin/python" ]',
+			'pip --version',
+			expect_stdout_contains = os.path.join('venv2', 'lib'))
+
+
+def test_create_from_cache_path_with_space():
+	"""
+	Test whether paths which need to be quoted are handled when a virtualenv is copied from a cached template.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv --no-activate "a b"')
+		
+		ws.run(
+			'venv "a b"',
+			'[ "$VIRTUAL_ENV" = "$PWD/a b" ]',
+			'pip --version')
+
+
+def test_create_from_cache_hardlinks_read_only():
+	"""
+	Test whether files which are hardlinked to a cached template are read-only, so that modifying them in place cannot modify the template.
+	"""
+	
+	with workspace() as ws:
+		ws.run('venv --no-activate')
+		
+		for dirpath, dirnames, filenames in os.walk(os.path.join(ws.cwd, 'venv')):
+			for i in filenames:
+				st = os.lstat(os.path.join(dirpath, i))
+				
+				if st.st_nlink > 1:
+					assert not st.st_mode & 0o222
+
+
+def test_create_from_incomplete_cache_entry():
+	"""
+	Test whether a cached template whose virtualenv has been removed is built again.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --no-activate',
+			'rm -rf ~/.cache/venv_cli/templates/*/venv',
+			'venv --no-activate venv2')
+		
+		ws.check_venv('venv2')
+
+
+def test_list_cache():
+	with workspace() as ws:
+		ws.run('venv --no-activate')
+		
+		ws.run(
+			'venv --list-cache',
+			expect_stdout_contains = 'virtualenv')
+
+
+def test_purge_cache():
+	with workspace() as ws:
+		ws.run('venv --no-activate')
+		
+		ws.run(
+			'venv --purge-cache',
+			expect_stderr_contains = 'Removed 1 cached templates')
+		
+		result = ws.run('venv --list-cache')
+		
+		assert not result.stdout
+
+
+def test_no_cache():
+	"""
+	Test whether --no-cache creates a virtualenv without creating a template.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --no-activate --no-cache')
+		
+		ws.check_venv()
+		
+		result = ws.run('venv --list-cache')
+		
+		assert not result.stdout
+
+
+def test_list_cache_conflicts():
+	with workspace() as ws:
+		ws.run(
+			'venv --list-cache --create',
+			expect_error = True)
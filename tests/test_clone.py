@@ -0,0 +1,77 @@
+from .helpers import *
+
+
+def test_clone():
+	"""
+	Test whether a cloned virtualenv refers to its own path and works, and whether installing a package into it leaves the source untouched.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv -n --clone venv venv2',
+			'[ -z "$(grep -rl "$PWD/venv/" venv2/bin venv2/pyvenv.cfg)" ]')
+		
+		ws.check_venv('venv2')
+		ws.run(
+			'venv venv2',
+			'[ "$VIRTUAL_ENV" = "$PWD/venv2" ]',
+			'pip --version',
+			expect_stdout_contains = os.path.join('venv2', 'lib'))
+		
+		ws.run(
+			'venv exec venv2 -- pip uninstall --yes setuptools',
+			'venv exec venv -- python -c "import setuptools"')
+
+
+def test_clone_shares_no_files():
+	"""
+	Test whether no files, including the stamp which records when a virtualenv has last been used, are shared between the source and the clone.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv exec venv -- true',
+			'venv -n --clone venv venv2')
+		
+		for dirpath, dirnames, filenames in os.walk(os.path.join(ws.cwd, 'venv2')):
+			for i in filenames:
+				assert os.lstat(os.path.join(dirpath, i)).st_nlink == 1
+		
+		stamp_paths = [os.path.join(ws.cwd, i, 'venv_cli_last_used') for i in ['venv', 'venv2']]
+		
+		assert not os.path.samefile(*stamp_paths)
+
+
+def test_clone_replaces_existing():
+	with workspace(virtualenvs = ['venv', 'venv2']) as ws:
+		ws.run(
+			'touch venv/marker',
+			'venv -n --clone venv venv2',
+			'[ -e venv2/marker ]')
+
+
+def test_clone_not_virtualenv():
+	"""
+	Test whether cloning fails if the source is not a virtualenv or the destination exists but is not a virtualenv, leaving the destination untouched.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.create_dir('dir')
+		ws.run(
+			'venv -n --clone dir venv',
+			expect_error = True,
+			expect_stderr_contains = 'dir is not a virtualenv')
+		
+		ws.run(
+			'venv -n --clone venv dir',
+			expect_error = True,
+			expect_stderr_contains = 'dir is not a virtualenv')
+		
+		ws.run(
+			'venv -n --clone venv venv/sub',
+			expect_error = True,
+			expect_stderr_contains = 'as one contains the other')
+		
+		ws.check_venv()
+		ws.check_dir(['venv', 'dir'], path = '.')
+		ws.check_dir([], [], path = 'dir')
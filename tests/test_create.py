@@ -80,4 +80,62 @@ def test_usability():
 		ws.run(
 			'venv',
 			'python setup.py develop')
-	
\ No newline at end of file
+
+
+def test_recreate_staged():
+	"""
+	Test whether --staged replaces an existing virtualenv with a new one which refers to its final path.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.create_file('venv/dummy')
+		
+		ws.run(
+			'venv --recreate --staged --no-activate')
+		
+		ws.check_file('venv/dummy', exists = False)
+		ws.check_dir(['venv'])
+		ws.run(
+			'venv',
+			'[ "$VIRTUAL_ENV" = "$PWD/venv" ]',
+			'[ "$(which pip)" = "$PWD/venv/bin/pip" ]',
+			'pip --version')
+
+
+def test_create_staged():
+	"""
+	Test whether --staged works when there is no existing virtualenv.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --staged --no-activate')
+		
+		ws.check_dir(['venv'])
+		ws.check_venv()
+
+
+def test_create_output_prefixed():
+	"""
+	Test whether the output of virtualenv is prefixed with the path of the virtualenv.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --no-activate --no-cache',
+			expect_stdout_contains = '[venv] created virtual environment')
+
+
+def test_create_removes_leftovers():
+	"""
+	Test whether directories left behind by an interrupted invocation are removed while the virtualenv is created.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'cp -a venv venv~venv_cli_backup',
+			'mkdir venv~venv_cli_delete',
+			'venv --recreate --no-activate')
+		
+		ws.check_dir(['venv'])
+		ws.check_venv()
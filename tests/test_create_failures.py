@@ -88,3 +88,36 @@ def test_recreate_failure():
 		
 		ws.check_dir(['venv'])
 		ws.check_file('venv/dummy')
+
+
+def test_recreate_staged_failure():
+	"""
+	Test whether failure to build a staged virtualenv leaves the existing one untouched.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.create_file('venv/dummy')
+		
+		ws.run('venv --staged --python no-such-python', expect_error = True)
+		
+		ws.check_dir(['venv'])
+		ws.check_file('venv/dummy')
+
+
+def test_create_interrupted():
+	"""
+	Test whether interrupting the creation of a virtualenv terminates virtualenv and does not leave a trace.
+	"""
+	
+	with workspace() as ws:
+		ws.create_dir('bin')
+		ws.create_file('bin/virtualenv', '#!/bin/sh\nfor i; do path=$i; done\nmkdir "$path"\nsleep 3\nmkdir -p "$path"\ntouch "$path/late"\n')
+		
+		ws.run(
+			'chmod +x bin/virtualenv',
+			'PATH="$PWD/bin:$PATH" timeout -s INT 1 venv --no-activate --no-cache 2> stderr || true',
+			'grep "Operation interrupted" stderr',
+			'rm -r bin stderr',
+			'sleep 3')
+		
+		ws.check_dir()
@@ -0,0 +1,66 @@
+import glob
+from .helpers import *
+
+
+def _site_packages_path(ws, venv, *names):
+	path, = glob.glob(os.path.join(ws.cwd, venv, 'lib', 'python*', 'site-packages', *names))
+	
+	return path
+
+
+def _inode(path):
+	return os.stat(path).st_ino
+
+
+def test_dedup():
+	"""
+	Test whether identical files in different virtualenvs are replaced with hardlinks to the same file and the virtualenvs keep working.
+	"""
+	
+	with workspace(virtualenvs = ['venv', 'venv2']) as ws:
+		ws.run(
+			'venv --dedup .',
+			expect_stderr_contains = 'Deduplicated 2 virtualenvs')
+		
+		path1 = _site_packages_path(ws, 'venv', 'pip', '__init__.py')
+		path2 = _site_packages_path(ws, 'venv2', 'pip', '__init__.py')
+		
+		assert _inode(path1) == _inode(path2)
+		assert not os.stat(path1).st_mode & 0o222
+		
+		# Files which are modified in place are never hardlinked.
+		pth_path = glob.glob(_site_packages_path(ws, 'venv', '') + '*.pth')[0]
+		
+		assert os.stat(pth_path).st_nlink == 1
+		
+		ws.run(
+			'venv exec venv2 -- python -m pip --version',
+			'venv --dedup .',
+			expect_stderr_contains = 'freeing 0.0 B in total')
+
+
+def test_dedup_shared_create():
+	"""
+	Test whether --shared shares the files of a newly created virtualenv with those already in the store.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv --dedup venv',
+			'venv -n --shared venv2',
+			expect_stderr_contains = 'Shared the files of venv2')
+		
+		path1 = _site_packages_path(ws, 'venv', 'pip', '__init__.py')
+		path2 = _site_packages_path(ws, 'venv2', 'pip', '__init__.py')
+		
+		assert _inode(path1) == _inode(path2)
+		
+		ws.check_venv('venv2')
+
+
+def test_dedup_not_a_directory():
+	with workspace() as ws:
+		ws.run(
+			'venv --dedup foo',
+			expect_error = True,
+			expect_stderr_contains = 'foo is not a directory')
@@ -0,0 +1,59 @@
+from .helpers import *
+
+
+def test_stdlib_engine():
+	"""
+	Test whether a virtualenv created by the venv module of the standard library is usable.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --no-activate --no-cache --engine stdlib')
+		
+		ws.check_dir(['venv'])
+		ws.run(
+			'venv',
+			'[ "$VIRTUAL_ENV" = "$PWD/venv" ]',
+			'[ "$(which pip)" = "$PWD/venv/bin/pip" ]',
+			'pip --version')
+
+
+def test_stdlib_engine_from_cache():
+	"""
+	Test whether copies of a template created by the venv module of the standard library refer to their own path, also when it needs to be quoted, and to the actual prompt.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --no-activate --engine stdlib',
+			'venv --no-activate --engine stdlib "a b"',
+			'venv --list-cache',
+			expect_stdout_contains = 'venv')
+		
+		ws.run(
+			'venv "a b"',
+			'[ "$VIRTUAL_ENV" = "$PWD/a b" ]',
+			'[ "$(which pip)" = "$PWD/a b/bin/pip" ]',
+			'[ "$VIRTUAL_ENV_PROMPT" = "(cwd) " ]',
+			'pip --version')
+
+
+def test_stdlib_engine_staged():
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv --recreate --staged --no-activate --no-cache --engine stdlib')
+		
+		ws.check_dir(['venv'])
+		ws.run(
+			'venv',
+			'[ "$VIRTUAL_ENV" = "$PWD/venv" ]',
+			'[ "$(which pip)" = "$PWD/venv/bin/pip" ]',
+			'pip --version')
+
+
+def test_virtualenv_engine_prompt():
+	with workspace() as ws:
+		ws.run(
+			'venv --no-activate',
+			'. venv/bin/activate',
+			'[ "$VIRTUAL_ENV_PROMPT" = cwd ]')
@@ -0,0 +1,44 @@
+from .helpers import *
+
+
+def test_exec():
+	"""
+	Test whether a command is run with the virtualenv activated.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv exec -- python -c "import sys; print(sys.prefix)"',
+			expect_stdout_contains = os.path.join(ws.cwd, 'venv'))
+		
+		ws.run(
+			'venv exec venv -- sh -c \'[ "$VIRTUAL_ENV" = "$PWD/venv" ] && which pip\'',
+			expect_stdout_contains = os.path.join('venv', 'bin', 'pip'))
+
+
+def test_exec_exit_status():
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv exec -- python -c "exit(3)" || echo "status $?"',
+			expect_stdout_contains = 'status 3')
+
+
+def test_exec_command_not_found():
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv exec -- does-not-exist || echo "status $?"',
+			expect_stdout_contains = 'status 127',
+			expect_stderr_contains = 'Running does-not-exist failed')
+
+
+def test_exec_failures():
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv exec venv2 -- true',
+			expect_error = True,
+			expect_stderr_contains = 'venv2 does not exist')
+		
+		ws.run(
+			'venv exec python -c pass',
+			expect_error = True,
+			expect_stderr_contains = 'Usage: venv exec')
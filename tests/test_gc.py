@@ -0,0 +1,108 @@
+import json
+from .helpers import *
+
+
+def test_gc_leftovers():
+	"""
+	Test whether directories left behind by interrupted invocations are removed and virtualenvs are kept.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'cp -a venv venv~venv_cli_backup',
+			'mkdir -p sub/venv2~venv_cli_delete sub/venv3~venv_cli_staging venv~venv_cli_backup~venv_cli_delete-1234abcd')
+		
+		ws.run(
+			'venv --gc . --dry-run',
+			expect_stderr_contains = '4 directories could be removed')
+		
+		ws.check_dir(['sub', 'venv', 'venv~venv_cli_backup', 'venv~venv_cli_backup~venv_cli_delete-1234abcd'])
+		
+		ws.run(
+			'venv --gc .',
+			expect_stderr_contains = 'Removed 4 directories')
+		
+		ws.check_dir(['sub', 'venv'])
+		
+		# The leftovers are locked using the locks of the virtualenvs they belong to, venv, sub/venv2 and sub/venv3.
+		ws.run('[ "$(ls ~/.cache/venv_cli/locks | wc -l)" = 3 ]')
+		ws.check_dir([], path = 'sub')
+		ws.check_venv()
+
+
+def test_gc_max_age():
+	"""
+	Test whether virtualenvs which have not been used for the specified time are removed.
+	"""
+	
+	with workspace(virtualenvs = ['venv', 'venv2']) as ws:
+		ws.run(
+			'touch -d "40 days ago" venv/pyvenv.cfg venv/bin/activate',
+			'venv --gc . --max-age 30',
+			expect_stderr_contains = 'not used for 40 days')
+		
+		ws.check_dir(['venv2'])
+
+
+def test_gc_activated_virtualenv_kept():
+	"""
+	Test whether activating a virtualenv marks it as used.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'touch -d "40 days ago" venv/pyvenv.cfg venv/bin/activate',
+			'venv',
+			'true')
+		
+		ws.run(
+			'venv --gc . --max-age 30',
+			expect_stderr_contains = 'Removed 0 directories')
+		
+		ws.check_dir(['venv'])
+
+
+def test_gc_budget():
+	"""
+	Test whether the least recently used virtualenvs are removed until the others fit into the budget.
+	"""
+	
+	with workspace(virtualenvs = ['venv', 'venv2', 'venv3']) as ws:
+		result = ws.run('venv --scan venv')
+		size = json.loads(result.stdout)['size']
+		
+		ws.run(
+			'touch -d "2 days ago" venv/pyvenv.cfg venv/bin/activate',
+			'touch -d "1 day ago" venv3/pyvenv.cfg venv3/bin/activate',
+			'venv --gc . --budget {}'.format(int(size * 1.5)),
+			expect_stderr_contains = 'Removed 2 directories')
+		
+		ws.check_dir(['venv2'])
+
+
+def test_gc_cache_dir_skipped():
+	"""
+	Test whether the cached templates are not mistaken for unused virtualenvs.
+	"""
+	
+	with workspace() as ws:
+		ws.run('venv --no-activate')
+		
+		ws.run(
+			'venv --gc ~ --max-age 0',
+			expect_stderr_contains = 'Removed 0 directories')
+		
+		ws.run(
+			'venv --no-activate venv2',
+			'venv --list-cache',
+			expect_stdout_contains = 'virtualenv')
+		
+		ws.check_venv('venv2')
+
+
+def test_gc_options_require_gc():
+	with workspace() as ws:
+		ws.run(
+			'venv --dry-run',
+			expect_error = True,
+			expect_stderr_contains = 'can only be specified together with --gc')
@@ -1,3 +1,4 @@
+import time
 from .helpers import *
 
 
@@ -48,6 +49,42 @@ def test_run_failure_in_venv():
 				'false')
 
 
+def test_run_output():
+	"""
+	Test whether the output and exit status of each call are reported separately, including output without a trailing newline.
+	"""
+	
+	with workspace() as ws:
+		result = ws.run('printf foo', 'printf bar >&2')
+		
+		assert (result.stdout, result.stderr) == ('foo', 'bar')
+		
+		result = ws.run('echo baz', 'exit 3', expect_error = True)
+		
+		assert (result.returncode, result.stdout, result.stderr) == (3, 'baz\n', '')
+
+
+def test_run_state_not_shared():
+	"""
+	Test whether changes to the shell state, background processes and commands reading stdin do not affect later calls.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'cd ..',
+			'export VENV_CLI_TEST=1',
+			'cat',
+			'(sleep 0.1; echo stray) &')
+		
+		time.sleep(0.5)
+		
+		result = ws.run(
+			'[ "$PWD" = "{}" ]'.format(ws.cwd),
+			'[ -z "$VENV_CLI_TEST" ]')
+		
+		assert result.stdout == ''
+
+
 def test_check_venv_not_existing():
 	with workspace() as ws:
 		ws.check_venv(exists = False)
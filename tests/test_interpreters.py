@@ -0,0 +1,35 @@
+from .helpers import *
+
+
+_python_version = '{}.{}'.format(*sys.version_info[:2])
+
+
+def test_list_pythons():
+	with workspace() as ws:
+		ws.run(
+			'venv --list-pythons',
+			expect_stdout_contains = 'CPython  {}'.format(_python_version))
+
+
+def test_python_version():
+	"""
+	Test whether an interpreter can be selected by its version.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --python {} --no-activate'.format(_python_version))
+		
+		ws.run(
+			'venv --test',
+			expect_stderr_contains = 'running Python {}.'.format(_python_version))
+
+
+def test_python_unknown_version():
+	with workspace() as ws:
+		ws.run(
+			'venv --python 2.1 --no-activate',
+			expect_error = True,
+			expect_stderr_contains = 'No interpreter found for 2.1')
+		
+		ws.check_dir()
@@ -0,0 +1,61 @@
+from .helpers import *
+
+
+_hold_lock_script = '''
+import sys, time
+from venv_cli.lock import locked_path
+
+with locked_path(sys.argv[1], 0):
+	open('locked', 'w').close()
+	time.sleep(float(sys.argv[2]))
+'''
+
+
+def test_concurrent_create():
+	"""
+	Test whether concurrent invocations creating the same virtualenv create it only once.
+	"""
+	
+	with workspace() as ws:
+		result = ws.run(
+			'for i in 1 2 3; do venv --no-activate --no-cache & done; wait')
+		
+		assert result.stderr.count('which has been created by another process') == 2
+		
+		ws.check_venv()
+		ws.check_dir(['venv'], [], exclude_hidden = False)
+
+
+def test_lock_timeout():
+	"""
+	Test whether waiting for another process holding the lock times out.
+	"""
+	
+	with workspace() as ws:
+		ws.create_file('hold_lock.py', _hold_lock_script)
+		
+		ws.run(
+			'python hold_lock.py venv 5 &',
+			'while ! [ -e locked ]; do sleep 0.1; done',
+			'venv --no-activate --lock-timeout 0.5',
+			expect_error = True,
+			expect_stderr_contains = 'Timed out after 0.5 s waiting for another process to finish creating venv')
+		
+		ws.check_venv(exists = False)
+
+
+def test_lock_released():
+	"""
+	Test whether a virtualenv is created after the lock is released, if it was not created by the process holding it.
+	"""
+	
+	with workspace() as ws:
+		ws.create_file('hold_lock.py', _hold_lock_script)
+		
+		ws.run(
+			'python hold_lock.py venv 1 &',
+			'while ! [ -e locked ]; do sleep 0.1; done',
+			'venv --no-activate',
+			expect_stderr_contains = 'Waiting for another process')
+		
+		ws.check_venv()
@@ -0,0 +1,106 @@
+from .helpers import *
+
+
+def test_multiple_pythons():
+	"""
+	Test whether a virtualenv is created for each interpreter when --python is specified multiple times.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --python python --python python3',
+			expect_stderr_contains = 'Created venv-python3 with python3')
+		
+		ws.check_dir(['venv-python', 'venv-python3'])
+		ws.check_venv('venv-python')
+		ws.check_venv('venv-python3')
+
+
+def test_matrix_file():
+	"""
+	Test whether the virtualenvs listed in a file are created.
+	"""
+	
+	with workspace() as ws:
+		ws.create_file('matrix.txt', '# Comment\npython3 env1\n\npython\n')
+		
+		ws.run(
+			'venv --matrix matrix.txt')
+		
+		ws.check_dir(['env1', 'venv-python'], ['matrix.txt'])
+		ws.check_venv('env1')
+		ws.check_venv('venv-python')
+
+
+def test_matrix_failure():
+	"""
+	Test whether failure to create one of the virtualenvs is reported without affecting the others.
+	"""
+	
+	with workspace() as ws:
+		ws.create_file('broken-python', '#!/bin/sh\nexit 1\n')
+		
+		ws.run(
+			'chmod +x broken-python',
+			'venv --python python --python ./broken-python',
+			expect_error = True,
+			expect_stderr_contains = '1 of 2 virtualenvs could not be created')
+		
+		ws.check_dir(['venv-python'], ['broken-python'])
+		ws.check_venv('venv-python')
+
+
+def test_matrix_unknown_python():
+	"""
+	Test whether an unknown interpreter is reported before any virtualenv is created.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --python python --python no-such-python',
+			expect_error = True,
+			expect_stderr_contains = 'No interpreter found for no-such-python')
+		
+		ws.check_dir()
+
+
+def test_matrix_file_invalid():
+	with workspace() as ws:
+		ws.create_file('matrix.txt', 'python env1 foo\n')
+		
+		ws.run(
+			'venv --matrix matrix.txt',
+			expect_error = True,
+			expect_stderr_contains = 'matrix.txt:1:')
+		
+		ws.check_dir([], ['matrix.txt'])
+
+
+def test_matrix_duplicate_paths():
+	"""
+	Test whether interpreters with the same name at different paths, which would share a virtualenv, are rejected before any virtualenv is created.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'mkdir bin',
+			'ln -s "$(command -v python)" bin/python',
+			'venv --python python --python "$PWD/bin/python"',
+			expect_error = True,
+			expect_stderr_contains = 'Multiple virtualenvs would be created at venv-python')
+		
+		ws.create_file('matrix.txt', 'python env1\npython3 env1\n')
+		ws.run(
+			'venv --matrix matrix.txt',
+			expect_error = True,
+			expect_stderr_contains = 'Multiple virtualenvs would be created at env1')
+		
+		ws.check_dir(['bin'], ['matrix.txt'])
+
+
+def test_matrix_setup():
+	with workspace(dummy_project = True) as ws:
+		ws.run(
+			'venv --setup --python python --python python3',
+			expect_error = True,
+			expect_stderr_contains = '--setup cannot be combined with')
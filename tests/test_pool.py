@@ -0,0 +1,83 @@
+from .helpers import *
+
+
+# Starts the pool daemon in the background and waits until it has a spare virtualenv. The daemon is terminated when the shell exits.
+_start_daemon_lines = [
+	'venv --pool-daemon --pool-size 2 2> daemon.log &',
+	'pid=$!',
+	'trap "kill $pid; wait $pid" EXIT',
+	'for i in $(seq 600); do venv --pool-status 2> /dev/null | grep -q " 1/" && break; sleep 0.1; done']
+
+
+def test_pool_claim():
+	"""
+	Test whether a virtualenv is created by claiming a spare virtualenv from the daemon and refers to its own path and prompt.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			*_start_daemon_lines,
+			'venv -n venv',
+			'grep "Handed out" daemon.log',
+			'[ -z "$(grep -rl venv-cli-template-prompt venv/bin)" ]',
+			'[ -z "$(grep -rl "$HOME/.cache/venv_cli/pool" venv/bin)" ]')
+		
+		ws.check_venv()
+		ws.run(
+			'venv',
+			'[ "$VIRTUAL_ENV" = "$PWD/venv" ]',
+			'pip --version',
+			expect_stdout_contains = os.path.join('venv', 'lib'))
+		
+		# The socket and spares are removed when the daemon terminates.
+		ws.run('[ ! -e ~/.cache/venv_cli/pool.sock ]', '[ ! -e ~/.cache/venv_cli/pool ]')
+
+
+def test_pool_other_file_system():
+	"""
+	Test whether no spare is claimed, and thus lost, for a virtualenv on a different file system than the pool.
+	"""
+	
+	with workspace() as ws:
+		other_dir = '/dev/shm'
+		
+		if not os.path.isdir(other_dir) or os.stat(other_dir).st_dev == os.stat(ws.cwd).st_dev:
+			pytest.skip('A directory on a different file system is necessary.')
+		
+		with tempfile.TemporaryDirectory(dir = other_dir) as temp_dir:
+			ws.run(
+				*_start_daemon_lines,
+				'venv -n {}/venv'.format(temp_dir),
+				'[ -z "$(grep "Handed out" daemon.log)" ]')
+			
+			ws.check_venv(os.path.join(temp_dir, 'venv'))
+
+
+def test_pool_no_cache():
+	"""
+	Test whether --no-cache does not use the pool.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			*_start_daemon_lines,
+			'venv -n --no-cache venv',
+			'[ -z "$(grep "Handed out" daemon.log)" ]')
+		
+		ws.check_venv()
+
+
+def test_pool_status_without_daemon():
+	with workspace() as ws:
+		ws.run(
+			'venv --pool-status',
+			expect_error = True,
+			expect_stderr_contains = 'No pool daemon is running')
+
+
+def test_pool_size_requires_daemon():
+	with workspace() as ws:
+		ws.run(
+			'venv --pool-size 3',
+			expect_error = True,
+			expect_stderr_contains = 'can only be specified together with --pool-daemon')
@@ -0,0 +1,57 @@
+import json
+from .helpers import *
+
+
+def _scan(ws, root, *options):
+	result = ws.run(' '.join(['venv', '--scan', root] + list(options)))
+	
+	return { i['path']: i for i in map(json.loads, result.stdout.splitlines()) }
+
+
+def test_scan():
+	"""
+	Test whether all virtualenvs below a directory are found and described.
+	"""
+	
+	with workspace(virtualenvs = ['venv', 'venv2']) as ws:
+		ws.create_dir('project')
+		ws.run('mv venv2 project')
+		
+		records = _scan(ws, '.')
+		
+		assert sorted(records) == ['./project/venv2', './venv']
+		
+		record = records['./venv']
+		
+		assert record['healthy']
+		assert record['problems'] == []
+		assert record['version'].startswith('{}.{}.'.format(*sys.version_info[:2]))
+		assert record['interpreter'] == os.path.realpath(sys.executable)
+		assert record['size'] > 0
+
+
+def test_scan_broken():
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run('ln -sfn /no-such-dir/python3 venv/bin/python')
+		
+		records = _scan(ws, '.', '-j', '2')
+		
+		assert not records['./venv']['healthy']
+		assert records['./venv']['interpreter'] is None
+
+
+def test_scan_virtualenv():
+	"""
+	Test whether the virtualenv itself is found when scanning it.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		assert list(_scan(ws, 'venv')) == ['venv']
+
+
+def test_scan_not_a_directory():
+	with workspace() as ws:
+		ws.run(
+			'venv --scan foo',
+			expect_error = True,
+			expect_stderr_contains = 'foo is not a directory')
@@ -34,3 +34,160 @@ def test_setup_failure():
 		
 		ws.check_dir(['venv'])
 		ws.check_file('venv/dummy')
+
+
+def _create_dependency_project(ws):
+	"""
+	Create a project which depends on a package available as a wheel in the directory `packages'.
+	"""
+	
+	ws.create_dir('dependency')
+	ws.create_file('dependency/setup.py', 'import setuptools\nsetuptools.setup(name = "venv_cli_dependency", py_modules = ["venv_cli_dependency"])\n')
+	ws.create_file('dependency/venv_cli_dependency.py', 'print("Dependency.")\n')
+	ws.run('venv/bin/pip wheel --quiet --no-build-isolation --no-deps --wheel-dir packages ./dependency')
+	
+	ws.create_file('setup.py', 'import setuptools\nsetuptools.setup(name = "venv_cli_dummy", py_modules = [], install_requires = ["venv_cli_dependency"])\n')
+
+
+def test_setup_dependencies_from_local_index():
+	"""
+	Test whether dependencies are installed from a local directory and kept in the wheelhouse.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		_create_dependency_project(ws)
+		
+		ws.run(
+			'venv --setup --find-links packages',
+			'python -c "import venv_cli_dependency"',
+			expect_stdout_contains = 'Dependency.')
+		
+		ws.run('ls ~/.cache/venv_cli/wheelhouse/venv_cli_dependency-*.whl')
+
+
+def test_setup_dependencies_from_wheelhouse():
+	"""
+	Test whether a recreated virtualenv gets its dependencies from the wheelhouse.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		_create_dependency_project(ws)
+		
+		ws.run('venv --setup --no-activate --find-links packages')
+		ws.run('rm -r packages')
+		
+		ws.run(
+			'venv --setup',
+			'python -c "import venv_cli_dependency"',
+			expect_stdout_contains = 'Dependency.')
+
+
+def test_setup_missing_dependency():
+	"""
+	Test whether a dependency which cannot be found is reported and the virtualenv is restored.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		_create_dependency_project(ws)
+		
+		ws.create_file('venv/dummy')
+		ws.run('rm -r packages')
+		ws.create_dir('packages')
+		
+		ws.run(
+			'venv --setup --find-links packages',
+			expect_error = True,
+			expect_stderr_contains = 'venv_cli_dependency')
+		
+		ws.check_file('venv/dummy')
+
+
+def test_setup_conflicting_dependencies():
+	"""
+	Test whether the output of pip is shown if installing the dependencies fails even though wheels have been built for all of them.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		_create_dependency_project(ws)
+		
+		ws.create_file('dependency/setup.py', 'import setuptools\nsetuptools.setup(name = "venv_cli_dependency", version = "2.0", py_modules = ["venv_cli_dependency"])\n')
+		ws.create_file('requirements.txt', 'venv_cli_dependency == 2.0\n')
+		ws.create_file('setup.py', 'import setuptools\nsetuptools.setup(name = "venv_cli_dummy", py_modules = [], install_requires = ["venv_cli_dependency != 2.0"])\n')
+		ws.run('venv/bin/pip wheel --quiet --no-build-isolation --no-deps --wheel-dir packages ./dependency')
+		
+		result = ws.run(
+			'venv --setup --find-links packages',
+			expect_error = True,
+			expect_stderr_contains = 'Installing the dependencies failed.')
+		
+		assert 'conflicting dependencies' in result.stderr
+		assert 'Traceback' not in result.stderr
+
+
+def test_setup_staged():
+	"""
+	Check that scripts installed while setting up a staged virtualenv can be run once it has been moved into place.
+	"""
+	
+	with workspace(virtualenvs = ['venv'], dummy_project = True) as ws:
+		ws.run(
+			'venv --setup --staged',
+			'venv_cli_dummy',
+			expect_stdout_contains = 'Yay.')
+		
+		ws.run('! [ -e venv~venv_cli_staging ]')
+
+
+def test_setup_dependencies_from_layer():
+	"""
+	Test whether the dependencies are restored from a cached snapshot when the same requirements are installed again, and whether their scripts refer to the new virtualenv.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.create_dir('dependency')
+		ws.create_file('dependency/setup.py', 'import setuptools\nsetuptools.setup(name = "venv_cli_dependency", py_modules = ["venv_cli_dependency"], entry_points = { "console_scripts": ["venv-cli-dependency = venv_cli_dependency:main"] })\n')
+		ws.create_file('dependency/venv_cli_dependency.py', 'import sys\ndef main():\n    print(sys.prefix)\n')
+		ws.run('venv/bin/pip wheel --quiet --no-build-isolation --no-deps --wheel-dir packages ./dependency')
+		
+		ws.create_file('setup.py', 'import setuptools\nsetuptools.setup(name = "venv_cli_dummy", py_modules = [], install_requires = ["venv_cli_dependency"])\n')
+		
+		ws.run(
+			'venv --setup --no-activate --find-links packages',
+			'venv --list-cache',
+			expect_stdout_contains = 'dependencies for')
+		
+		# Installing the dependency would fail now.
+		ws.run('rm -r packages ~/.cache/venv_cli/wheelhouse')
+		
+		ws.run(
+			'venv --setup --find-links packages venv2',
+			'venv-cli-dependency',
+			expect_stdout_contains = os.path.join(ws.cwd, 'venv2'))
+		
+		# Files which are hardlinked to the snapshot are read-only, so that modifying them in place cannot modify the snapshot.
+		for dirpath, dirnames, filenames in os.walk(os.path.join(ws.cwd, 'venv2')):
+			for i in filenames:
+				st = os.lstat(os.path.join(dirpath, i))
+				
+				if st.st_nlink > 1:
+					assert not st.st_mode & 0o222
+
+
+def test_setup_prebuild_wheels():
+	"""
+	Test whether the wheels for the requirements in requirements.txt are built while the virtualenv is created and then installed from the wheelhouse.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		_create_dependency_project(ws)
+		
+		ws.create_file('setup.py', 'import setuptools\nsetuptools.setup(name = "venv_cli_dummy", py_modules = [])\n')
+		ws.create_file('requirements.txt', 'venv_cli_dependency\n')
+		
+		result = ws.run(
+			'venv --setup --find-links packages',
+			'python -c "import venv_cli_dependency"',
+			expect_stdout_contains = 'Dependency.',
+			expect_stderr_contains = 'Building wheels for 1 requirements while the virtualenv is being created.')
+		
+		assert 'Building wheels for 1 requirements.' not in result.stderr
@@ -0,0 +1,69 @@
+from .helpers import *
+
+
+def test_shell_init_activate():
+	"""
+	Test whether the shell function activates an existing virtualenv in the current shell.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'eval "$(venv --shell-init)"',
+			'pid=$$',
+			'venv',
+			'[ "$$" = "$pid" ]',
+			'[ "$VIRTUAL_ENV" = "$PWD/venv" ]',
+			'[ "$(which python)" = "$PWD/venv/bin/python" ]')
+
+
+def test_shell_init_create():
+	"""
+	Test whether the shell function activates a virtualenv created by the venv command in the current shell.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'eval "$(venv --shell-init)"',
+			'pid=$$',
+			'venv -c',
+			'[ "$$" = "$pid" ]',
+			'[ "$VIRTUAL_ENV" = "$PWD/venv" ]',
+			expect_stderr_contains = 'Activating virtualenv venv')
+		
+		ws.check_venv()
+
+
+def test_shell_init_switch():
+	"""
+	Test whether activating a different virtualenv deactivates the current one.
+	"""
+	
+	with workspace(virtualenvs = ['venv', 'venv2']) as ws:
+		ws.run(
+			'eval "$(venv --shell-init)"',
+			'venv',
+			'venv venv2',
+			'[ "$VIRTUAL_ENV" = "$PWD/venv2" ]',
+			'! [[ ":$PATH:" = *":$PWD/venv/bin:"* ]]')
+
+
+def test_shell_init_error():
+	with workspace() as ws:
+		ws.run(
+			'eval "$(venv --shell-init)"',
+			'venv venv2',
+			expect_error = True,
+			expect_stderr_contains = 'does not exist')
+
+
+def test_shell_init_no_activate():
+	"""
+	Test whether output of the venv command is not evaluated by the shell function.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'eval "$(venv --shell-init)"',
+			'venv --help',
+			'[ -z "$VIRTUAL_ENV" ]',
+			expect_stdout_contains = 'usage')
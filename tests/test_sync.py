@@ -0,0 +1,77 @@
+from .helpers import *
+
+
+def test_sync_create():
+	"""
+	Test whether --sync creates and sets up a missing virtualenv.
+	"""
+	
+	with workspace(dummy_project = True) as ws:
+		ws.run(
+			'venv --sync',
+			'venv_cli_dummy',
+			expect_stdout_contains = 'Yay.')
+
+
+def test_sync_unchanged():
+	"""
+	Test whether --sync does nothing when nothing has changed since the virtualenv was set up.
+	"""
+	
+	with workspace(dummy_project = True) as ws:
+		ws.run('venv --setup --no-activate')
+		ws.create_file('venv/dummy')
+		
+		ws.run(
+			'venv --sync --no-activate',
+			expect_stderr_contains = 'is up to date')
+		
+		ws.check_file('venv/dummy')
+
+
+def test_sync_dependencies_changed():
+	"""
+	Test whether --sync reinstalls the project into the existing virtualenv when setup.py has changed.
+	"""
+	
+	with workspace(dummy_project = True) as ws:
+		ws.run('venv --sync --no-activate')
+		ws.create_file('venv/dummy')
+		ws.run('echo "# Changed." >> setup.py')
+		
+		ws.run(
+			'venv --sync',
+			'venv_cli_dummy',
+			expect_stdout_contains = 'Yay.',
+			expect_stderr_contains = 'reinstalling them')
+		
+		ws.check_file('venv/dummy')
+		
+		ws.run(
+			'venv --sync --no-activate',
+			expect_stderr_contains = 'is up to date')
+
+
+def test_sync_base_changed():
+	"""
+	Test whether --sync recreates the virtualenv when the recorded interpreter does not match.
+	"""
+	
+	with workspace(dummy_project = True) as ws:
+		ws.run('venv --sync --no-activate')
+		ws.create_file('venv/dummy')
+		ws.create_file('venv/venv_cli_fingerprint.json', '{"python": "python", "base": "", "dependencies": ""}')
+		
+		ws.run(
+			'venv --sync',
+			'venv_cli_dummy',
+			expect_stdout_contains = 'Yay.')
+		
+		ws.check_file('venv/dummy', exists = False)
+
+
+def test_sync_conflicts():
+	with workspace() as ws:
+		ws.run(
+			'venv --sync --recreate',
+			expect_error = True)
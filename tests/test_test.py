@@ -74,3 +74,73 @@ def test_test_old_python_version():
 			
 			# Check that we didn't get an empty version string. This is brittle and should probably be replaced by something more robust.
 			assert 'is a virtualenv running .' not in res.stderr
+
+
+def test_test_version_matches_interpreter():
+	"""
+	Test whether the version string read from the virtualenv's metadata is the same as the one reported by the interpreter.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		version = ws.run('venv/bin/python --version 2>&1').stdout.strip()
+		
+		ws.run(
+			'venv --test',
+			expect_stderr_contains = 'is a virtualenv running {}.'.format(version))
+
+
+def test_test_version_without_metadata():
+	"""
+	Test whether the version string is determined when the virtualenv has no pyvenv.cfg.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		version = ws.run('venv/bin/python --version 2>&1').stdout.strip()
+		
+		os.remove(os.path.join(ws.cwd, 'venv', 'pyvenv.cfg'))
+		
+		# Once to fill the cache and once to use it.
+		for i in range(2):
+			ws.run(
+				'venv --test',
+				expect_stderr_contains = 'is a virtualenv running {}.'.format(version))
+
+
+def test_test_deep():
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv --test --deep',
+			expect_stderr_contains = 'is a virtualenv running')
+
+
+def test_test_deep_interpreter_removed():
+	"""
+	Test whether --deep detects that the interpreter of the virtualenv has been removed.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv --test')
+		
+		ws.run(
+			'ln -sfn /no-such-dir/python3 venv/bin/python',
+			'venv --test --deep',
+			expect_error = True,
+			expect_stderr_contains = 'bin/python is a dangling symlink to /no-such-dir/python3')
+
+
+def test_test_deep_home_removed():
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'sed -i "s|^home = .*|home = /no-such-dir/bin|" venv/pyvenv.cfg',
+			'venv --test --deep',
+			expect_error = True,
+			expect_stderr_contains = 'home /no-such-dir/bin of the base interpreter does not exist')
+
+
+def test_test_deep_requires_test():
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'venv --deep',
+			expect_error = True,
+			expect_stderr_contains = '--deep can only be specified together with --test')
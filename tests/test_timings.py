@@ -0,0 +1,68 @@
+from .helpers import *
+
+
+def test_timings():
+	"""
+	Test whether the phases of creating a virtualenv are printed.
+	"""
+	
+	with workspace() as ws:
+		result = ws.run(
+			'venv --no-activate --timings',
+			expect_stderr_contains = 'total')
+		
+		for i in 'parse_args', 'create', 'template', 'remove_backup':
+			assert i in result.stderr
+
+
+def test_timings_not_printed():
+	with workspace() as ws:
+		result = ws.run(
+			'venv --no-activate')
+		
+		assert 'total' not in result.stderr
+
+
+def test_stats():
+	"""
+	Test whether the timings of earlier invocations are summarized.
+	"""
+	
+	with workspace() as ws:
+		ws.run(
+			'venv --stats',
+			expect_stderr_contains = 'No timings have been recorded yet.')
+		
+		ws.run(
+			'venv --no-activate',
+			'venv --recreate --no-activate')
+		
+		result = ws.run(
+			'venv --stats')
+		
+		assert ' 2 runs' in [i for i in result.stdout.splitlines() if i.startswith('create ')][0]
+
+
+def test_timings_environment_variable():
+	"""
+	Test whether setting VENV_CLI_TIMINGS records the timings of activating an existing virtualenv.
+	"""
+	
+	with workspace(virtualenvs = ['venv']) as ws:
+		ws.run(
+			'export VENV_CLI_TIMINGS=1',
+			'venv',
+			'true',
+			expect_stderr_contains = 'exec_shell')
+		
+		ws.run(
+			'venv --stats',
+			expect_stdout_contains = 'python_version')
+
+
+def test_stats_conflicts():
+	with workspace() as ws:
+		ws.run(
+			'venv --stats --recreate',
+			expect_error = True,
+			expect_stderr_contains = 'cannot be combined')
@@ -1,6 +1,9 @@
-import os, sys, contextlib, argparse, subprocess, shutil, io, tempfile
+# Only modules which are needed to activate an existing virtualenv are imported here. Everything else is imported where it is used to keep the startup time low.
+import os, sys, contextlib
 
 
+__version__ = '0.1'
+
 # TODO: Currently hardcoded. Need to see which shells we want to support and how we want to detect a user's shell.
 _shell = 'bash'
 
@@ -16,6 +19,43 @@ def log(msg, *args):
 	print('{}: {}'.format(os.path.basename(sys.argv[0]), msg.format(*args)), file = sys.stderr)
 
 
+# The timings.Timings instance which records the phases of the current invocation or None, if they are not recorded.
+_timings = None
+
+
+@contextlib.contextmanager
+def span(name):
+	"""
+	Record the duration of the enclosed phase of the current invocation, if timings are recorded.
+	"""
+	
+	if _timings is None:
+		yield
+	else:
+		with _timings.span(name):
+			yield
+
+
+def start_timings(report : bool):
+	global _timings
+	
+	from .timings import Timings
+	
+	_timings = Timings(report)
+
+
+def finish_timings(status):
+	"""
+	Print and record the timings of the current invocation, if they are recorded. This is also called right before the process is replaced by a shell, in which case status is None.
+	"""
+	
+	global _timings
+	
+	if _timings is not None:
+		timings, _timings = _timings, None
+		timings.finish(sys.argv[1:], status)
+
+
 def bash_escape_string(string):
 	"""
 	Return a version of string which can be used in a bash script without additional escaping.
@@ -30,7 +70,26 @@ class CommandResult:
 		self.stderr = stderr
 
 
-def command(*args, use_stdout = False, use_stderr = False):
+class CommandError(Exception):
+	def __init__(self, args, result : CommandResult):
+		super().__init__('Error running command: {}'.format(' '.join(args)))
+		
+		self.result = result
+
+
+def command(*args, use_stdout = False, use_stderr = False, prefix : str = None):
+	"""
+	Run a command and wait for it to finish. If prefix is specified, the output which is not captured is streamed with that prefix, as by tasks.run_command().
+	"""
+	
+	if prefix is not None:
+		from .tasks import run, run_command
+		
+		return run(run_command(*args, use_stdout = use_stdout, use_stderr = use_stderr, prefix = prefix))
+	
+	# Commands whose output is not streamed are mostly short, so they are run without the cost of importing asyncio.
+	import subprocess
+	
 	process = subprocess.Popen(
 		args,
 		stdout = subprocess.PIPE if use_stdout else None,
@@ -39,13 +98,17 @@ def command(*args, use_stdout = False, use_stderr = False):
 	
 	stdout, stderr = process.communicate()
 	
+	result = CommandResult(stdout, stderr)
+	
 	if process.returncode:
-		raise Exception('Error running command: {}'.format(' '.join(args)))
+		raise CommandError(args, result)
 	
-	return CommandResult(stdout, stderr)
+	return result
 
 
 def rm_temp(path):
+	import shutil
+	
 	try:
 		if os.path.exists(path):
 			shutil.rmtree(path)
@@ -53,40 +116,127 @@ def rm_temp(path):
 		raise UserError('Removing temporary path {} failed: {}', path, e)
 
 
+@contextlib.contextmanager
+def removed_in_background(paths : list):
+	"""
+	Remove those of the specified paths which exist while the context is active. They are renamed first, so that they can be created again right away. When the context is left, this waits until they have been removed.
+	"""
+	
+	import uuid
+	
+	moved_paths = []
+	
+	for i in paths:
+		if os.path.lexists(i):
+			moved_path = '{}~venv_cli_delete-{}'.format(i, uuid.uuid4().hex[:8])
+			
+			os.rename(i, moved_path)
+			moved_paths.append(moved_path)
+	
+	if not moved_paths:
+		yield
+		
+		return
+	
+	from .tasks import call_in_thread, gather, in_background
+	
+	with in_background(gather(*(call_in_thread(rm_temp, i) for i in moved_paths))):
+		yield
+
+
 @contextlib.contextmanager
 def backed_up_dir(path):
 	"""
 	If there is a directory at the specified path, it is moved to a backup path when the context is entered. If the context is left normally, the backup is deleted. Otherwise, anything at the specified path is removed and the backup is moved back in place.
+	
+	Leftovers of previous invocations are removed while the context is active.
 	"""
 	
 	backup_path = path + '~venv_cli_backup'
 	delete_path = path + '~venv_cli_delete'
 	
-	rm_temp(backup_path)
-	rm_temp(delete_path)
+	with removed_in_background([backup_path, delete_path]):
+		with span('backup'):
+			if os.path.exists(path):
+				os.rename(path, backup_path)
+		
+		try:
+			yield
+		except:
+			with span('restore_backup'):
+				if os.path.exists(path):
+					os.rename(path, delete_path)
+				
+				if os.path.exists(backup_path):
+					os.rename(backup_path, path)
+				
+				rm_temp(delete_path)
+			
+			raise
+		else:
+			with span('remove_backup'):
+				if os.path.exists(backup_path):
+					rm_temp(backup_path)
+
+
+def exchange_paths(path1, path2):
+	"""
+	Atomically exchange two paths using renameat2(), if the platform supports it. Returns False, if this is not possible.
+	"""
+	
+	import ctypes
 	
-	if os.path.exists(path):
-		os.rename(path, backup_path)
+	# From <linux/fs.h>.
+	rename_exchange = 2
+	at_fdcwd = -100
 	
 	try:
-		yield
-	except:
-		if os.path.exists(path):
-			os.rename(path, delete_path)
-		
-		if os.path.exists(backup_path):
-			os.rename(backup_path, path)
-		
-		rm_temp(delete_path)
-		
-		raise
-	else:
-		if os.path.exists(backup_path):
+		renameat2 = ctypes.CDLL(None, use_errno = True).renameat2
+	except AttributeError:
+		return False
+	
+	if renameat2(at_fdcwd, os.fsencode(path1), at_fdcwd, os.fsencode(path2), rename_exchange):
+		return False
+	
+	return True
+
+
+@contextlib.contextmanager
+def staged_dir(path):
+	"""
+	Yields a staging path next to the specified path. If the context is left normally, whatever has been created at the staging path replaces the directory at the specified path, using a single rename, if possible. Otherwise, the staging path is removed and the specified path is left untouched.
+	
+	Leftovers of previous invocations are removed while the context is active.
+	"""
+	
+	staging_path = path + '~venv_cli_staging'
+	backup_path = path + '~venv_cli_backup'
+	
+	with removed_in_background([staging_path, backup_path]):
+		try:
+			yield staging_path
+		except:
+			with span('remove_staging'):
+				rm_temp(staging_path)
+			
+			raise
+	
+	with span('replace'):
+		if not os.path.exists(path):
+			os.rename(staging_path, path)
+		elif exchange_paths(staging_path, path):
+			# The staging path now contains the previous directory.
+			rm_temp(staging_path)
+		else:
+			os.rename(path, backup_path)
+			os.rename(staging_path, path)
 			rm_temp(backup_path)
 
 
 @contextlib.contextmanager
 def temporary_script(lines : list):
+	import io, tempfile
+	
 	# The script close the original file descriptor upon execution. But if execution fails, TemporaryFile should close it.
 	with tempfile.TemporaryFile() as file:
 		fd = file.fileno()
@@ -106,20 +256,72 @@ def temporary_script(lines : list):
 		yield name
 
 
-def exec_shell(rc_lines : list):
+@contextlib.contextmanager
+def piped_script(lines : list):
+	"""
+	Like temporary_script() but passes the script through a pipe instead of a file. The script must fit into the pipe's buffer.
 	"""
-	Replace the current process with a new shell and provide it with an rc file with the specified content.
 	
-	This function does not return unless a failure occurs.
+	read_fd, write_fd = os.pipe()
+	
+	try:
+		content = ''.join(i + '\n' for i in ['exec {}<&-'.format(read_fd)] + lines).encode()
+		
+		while content:
+			content = content[os.write(write_fd, content):]
+	finally:
+		os.close(write_fd)
+	
+	try:
+		os.set_inheritable(read_fd, True)
+		
+		yield '/dev/fd/{}'.format(read_fd)
+	finally:
+		os.close(read_fd)
+
+
+def which(name):
+	"""
+	Like shutil.which() but without the cost of importing shutil.
+	"""
+	
+	for i in os.get_exec_path():
+		path = os.path.join(i, name)
+		
+		if os.path.isfile(path) and os.access(path, os.X_OK):
+			return path
+	
+	return None
+
+
+def clean_environ():
+	"""
+	Return a copy of the environment without variables which would confuse interpreters started from it.
 	"""
 	
-	bash_executable = shutil.which(_shell)
 	env = dict(os.environ)
 	
 	if '__PYVENV_LAUNCHER__' in env:
 		del env['__PYVENV_LAUNCHER__']
 	
-	with temporary_script(rc_lines) as name:
+	return env
+
+
+def exec_shell(rc_lines : list):
+	"""
+	Replace the current process with a new shell and provide it with an rc file with the specified content.
+	
+	This function does not return unless a failure occurs.
+	"""
+	
+	with span('exec_shell'):
+		bash_executable = which(_shell)
+		env = clean_environ()
+	
+	# The time it takes the shell to start cannot be recorded by this process.
+	finish_timings(None)
+	
+	with piped_script(rc_lines) as name:
 		# TODO: We assume that the only open file descriptors at this time are stdin, stderr, stdout and the rcfile.
 		os.execvpe(bash_executable, [_shell, '--rcfile', name, '-i'], env)
 
@@ -128,33 +330,274 @@ class Virtualenv:
 	def __init__(self, path):
 		self.path = path
 	
-	def create(self, python : str, prompt : str, setup : bool):
-		with backed_up_dir(self.path):
-			command('virtualenv', '--python', python, '--prompt', prompt, self.path)
+	def create(self, python : str, prompt : str, setup : bool, use_cache : bool = True, find_links : list = [], jobs : int = None, staged : bool = False, engine : str = 'virtualenv', use_pool : bool = False):
+		"""
+		Create a new virtualenv at this path, replacing any existing one, using the engine with the specified name from engines.engines.
+		
+		If staged is set, the virtualenv is built at a separate path and only moved into place once it is complete. Otherwise, an existing virtualenv is moved away before the new one is built.
+		
+		If use_pool is set, a spare virtualenv is claimed from the pool daemon, if one is running.
+		"""
+		
+		with span('create'):
+			if staged:
+				from .relocate import relocate_tree
+				
+				with staged_dir(self.path) as staging_path:
+					Virtualenv(staging_path)._create(python, prompt, setup, use_cache, find_links, jobs, engine, use_pool)
+					
+					with span('relocate'):
+						relocate_tree(staging_path, os.path.abspath(staging_path), os.path.abspath(self.path))
+			else:
+				with backed_up_dir(self.path):
+					self._create(python, prompt, setup, use_cache, find_links, jobs, engine, use_pool)
+	
+	def _create(self, python : str, prompt : str, setup : bool, use_cache : bool, find_links : list, jobs : int, engine_name : str, use_pool : bool):
+		from .engines import engines
+		
+		engine = engines[engine_name]
+		created = False
+		
+		if setup:
+			from .wheelhouse import prebuilding_wheels
 			
-			if setup:
-				lines = [
-					'set -e',
-					'. {}/bin/activate'.format(bash_escape_string(self.path)),
-					'python setup.py develop']
+			prebuild = prebuilding_wheels(python, find_links, jobs)
+		else:
+			prebuild = contextlib.nullcontext()
+		
+		with prebuild:
+			if use_pool:
+				from .pool import claim_spare
+				
+				with span('pool'):
+					created = claim_spare(self.path, python, prompt, engine.name)
+			
+			if use_cache and not created:
+				from .templates import create_from_template
 				
-				with temporary_script(lines) as script:
-					command('bash', script)
+				with span('template'):
+					created = create_from_template(self.path, python, prompt, engine)
+			
+			if not created:
+				with span(engine.name):
+					engine.create(self.path, python, prompt)
+		
+		if setup:
+			self.setup_project(find_links, jobs, use_cache)
 	
-	def activate(self):
-		lines = [
-			'[ -e ~/.bashrc ] && . ~/.bashrc',
-			'. {}/bin/activate || exit $?'.format(bash_escape_string(self.path))]
+	def setup_project(self, find_links : list = [], jobs : int = None, use_cache : bool = False):
+		"""
+		Install the dependencies of the project in the current directory from the local wheelhouse and then run `python setup.py develop'.
+		
+		If use_cache is set, the dependencies are installed from a cached snapshot, if possible. This requires that the virtualenv has just been created.
+		"""
 		
-		exec_shell(lines)
+		from .layers import install_dependencies_from_layer
+		from .wheelhouse import install_dependencies
+		
+		with span('setup'):
+			with span('dependencies'):
+				if use_cache:
+					install_dependencies_from_layer(self, find_links, jobs)
+				else:
+					install_dependencies(self, find_links, jobs)
+			
+			lines = [
+				'set -e',
+				'. {}/bin/activate'.format(bash_escape_string(self.path)),
+				'python setup.py develop']
+			
+			with span('develop'), temporary_script(lines) as script:
+				command('bash', script, prefix = self.path)
+	
+	def activate(self, script_fd : int = None):
+		"""
+		Replace the current process with a new shell in which this virtualenv is activated.
+		
+		If script_fd is specified, the commands which activate this virtualenv in an existing shell are written to that file descriptor instead. This is used by the shell function printed by --shell-init.
+		"""
+		
+		self.mark_used()
+		
+		if script_fd is None:
+			lines = [
+				'[ -e ~/.bashrc ] && . ~/.bashrc',
+				'. {}/bin/activate || exit $?'.format(bash_escape_string(self.path))]
+			
+			exec_shell(lines)
+		else:
+			lines = [
+				'if declare -F deactivate > /dev/null; then deactivate; fi',
+				'. {}/bin/activate'.format(bash_escape_string(os.path.abspath(self.path)))]
+			
+			with open(script_fd, 'w', encoding = 'utf-8', closefd = False) as file:
+				for i in lines:
+					print(i, file = file)
 	
 	@property
-	def python_version_string(self):
+	def last_used_path(self):
+		return os.path.join(self.path, 'venv_cli_last_used')
+	
+	def mark_used(self):
 		"""
-		Given the path to a virtualenv return the Python version string for the installed interpreter. This is what `python --version` returns.
+		Record that this virtualenv is being used by replacing an empty file in it. Its modification time is used by --gc to find virtualenvs which are no longer used. The file is replaced instead of being truncated, in case it is a hardlink shared with another virtualenv.
+		"""
+		
+		temp_path = self.last_used_path + '~venv_cli_partial'
+		
+		try:
+			os.close(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666))
+			os.replace(temp_path, self.last_used_path)
+		except OSError:
+			# E.g. a read-only virtualenv.
+			pass
+	
+	@property
+	def activated_environ(self):
+		"""
+		Return a copy of the environment with the changes made by sourcing this virtualenv's bin/activate.
+		"""
+		
+		env = clean_environ()
+		path = os.path.abspath(self.path)
+		
+		env['VIRTUAL_ENV'] = path
+		env['PATH'] = os.pathsep.join([os.path.join(path, 'bin')] + ([env['PATH']] if env.get('PATH') else []))
+		env.pop('PYTHONHOME', None)
+		
+		return env
+	
+	def exec_command(self, args : list):
+		"""
+		Replace the current process with the specified command, running with this virtualenv activated. The command is looked up on the activated PATH.
+		
+		This function does not return unless a failure occurs.
+		"""
+		
+		env = self.activated_environ
+		
+		self.mark_used()
+		finish_timings(None)
+		
+		try:
+			os.execvpe(args[0], args, env)
+		except OSError as e:
+			raise UserError('Running {} failed: {}', args[0], e, exit_code = 127 if isinstance(e, FileNotFoundError) else 126)
+	
+	@property
+	def pyvenv_cfg(self):
+		"""
+		Return the settings from the virtualenv's pyvenv.cfg as a dict or None, if the file does not exist.
+		"""
+		
+		try:
+			with open(os.path.join(self.path, 'pyvenv.cfg'), 'r', encoding = 'utf-8') as file:
+				lines = file.read().splitlines()
+		except OSError:
+			return None
+		
+		settings = { }
+		
+		for i in lines:
+			key, sep, value = i.partition('=')
+			
+			if sep:
+				settings[key.strip()] = value.strip()
+		
+		return settings
+	
+	def _configured_python_version_string(self):
+		"""
+		Return the version string of a CPython interpreter as recorded in pyvenv.cfg or None, if it cannot be determined that way.
+		"""
+		
+		settings = self.pyvenv_cfg
+		
+		if settings is None or settings.get('implementation', 'CPython') != 'CPython':
+			return None
+		
+		# Written by virtualenv >= 20, e.g. `3.9.1.final.0`.
+		parts = settings.get('version_info', '').split('.')
+		
+		if len(parts) != 5:
+			return None
+		
+		major, minor, micro, release_level, serial = parts
+		
+		# Ignore the setting if the virtualenv has been created for a different version, which should not happen.
+		if not os.path.isdir(os.path.join(self.path, 'lib', 'python{}.{}'.format(major, minor))):
+			return None
+		
+		suffix = { 'alpha': 'a', 'beta': 'b', 'candidate': 'rc' }.get(release_level)
+		version = '{}.{}.{}'.format(major, minor, micro)
+		
+		if suffix is not None:
+			version += suffix + serial
+		
+		return 'Python {}'.format(version)
+	
+	def health_problems(self):
+		"""
+		Return a list of descriptions of problems which prevent this virtualenv from working, typically because the interpreter it has been created for has been upgraded or removed.
+		
+		Only the file system is inspected using stat() and readlink(), the interpreter is not started. The stdlib location is only checked for CPython.
 		"""
 		
-		result = command(os.path.join(self.path, 'bin', 'python'), '--version', use_stdout = True, use_stderr = True)
+		import re
+		
+		settings = self.pyvenv_cfg
+		
+		if settings is None:
+			return ['pyvenv.cfg is missing']
+		
+		bin_path = os.path.join(self.path, 'bin')
+		problems = ['bin/{} does not exist'.format(i) for i in ['activate', 'python'] if not os.path.lexists(os.path.join(bin_path, i))]
+		
+		try:
+			names = sorted(os.listdir(bin_path))
+		except OSError:
+			names = []
+		
+		for i in names:
+			path = os.path.join(bin_path, i)
+			
+			if os.path.islink(path) and not os.path.exists(path):
+				problems.append('bin/{} is a dangling symlink to {}'.format(i, os.readlink(path)))
+		
+		home = settings.get('home')
+		
+		if home is None:
+			problems.append('pyvenv.cfg does not specify the home of the base interpreter')
+		elif not os.path.isdir(home):
+			problems.append('home {} of the base interpreter does not exist'.format(home))
+		
+		# Written by virtualenv and the venv module, e.g. `3.9.1.final.0` and `3.9.1`.
+		match = re.match(r'(\d+)\.(\d+)', settings.get('version_info') or settings.get('version', ''))
+		
+		if match is None:
+			problems.append('pyvenv.cfg does not specify the Python version')
+			
+			return problems
+		
+		version = '{}.{}'.format(*match.groups())
+		
+		if settings.get('implementation', 'CPython') == 'CPython':
+			if not os.path.isdir(os.path.join(self.path, 'lib', 'python' + version)):
+				problems.append('lib/python{} does not exist'.format(version))
+			
+			# E.g. `/usr/bin/python3` now pointing to `python3.10` instead of `python3.9`.
+			target_match = re.match(r'python(\d+\.\d+)$', os.path.basename(os.path.realpath(self.python_path)))
+			
+			if target_match is not None and target_match.group(1) != version:
+				problems.append('bin/python runs Python {} instead of {}'.format(target_match.group(1), version))
+			
+			if home is not None and os.path.isdir(home) and not os.path.isfile(os.path.join(os.path.dirname(home), 'lib', 'python' + version, 'os.py')):
+				problems.append('the standard library of Python {} does not exist below {}'.format(version, os.path.dirname(home)))
+		
+		return problems
+	
+	def _run_python_version(self):
+		result = command(self.python_path, '--version', use_stdout = True, use_stderr = True)
 		
 		assert bool(result.stdout) != bool(result.stderr)
 		
@@ -163,6 +606,27 @@ class Virtualenv:
 		else:
 			return result.stderr.decode().strip()
 	
+	@property
+	def python_path(self):
+		return os.path.join(self.path, 'bin', 'python')
+	
+	@property
+	def python_version_string(self):
+		"""
+		Given the path to a virtualenv return the Python version string for the installed interpreter. This is what `python --version` returns.
+		
+		The version is read from the virtualenv's metadata, if possible, so that the interpreter does not need to be started. Otherwise, the result of running the interpreter is cached for as long as the interpreter's executable does not change.
+		"""
+		
+		version = self._configured_python_version_string()
+		
+		if version is None:
+			from .cache import memoize_for_file
+			
+			version = memoize_for_file(self.python_path, 'python_version', self._run_python_version)
+		
+		return version
+	
 	@property
 	def path_exists(self):
 		return os.path.exists(self.path)
@@ -173,40 +637,157 @@ class Virtualenv:
 
 
 def parse_args():
-	parser = argparse.ArgumentParser(description = 'Create, setup and/or activate a virtualenv within a newly started shell.')
+	import argparse
+	
+	parser = argparse.ArgumentParser(description = 'Create, setup and/or activate a virtualenv within a newly started shell.', epilog = 'Use `venv exec [path] -- command [args...]\' to run a command with an existing virtualenv activated without starting a shell.')
 	
 	parser.add_argument('-c', '--create', action = 'store_true', help = 'Create virtualenv, unless one already exists at the specified path, before activating it.')
 	parser.add_argument('-r', '--recreate', action = 'store_true', help = 'Remove an already existing virtualenv before creating a new one. This implies --create.')
-	parser.add_argument('-s', '--setup', action = 'store_true', help = 'Run `python setup.py develop\' after creating the virtualenv. This implies --recreate.')
+	parser.add_argument('-s', '--setup', action = 'store_true', help = 'Install the dependencies of the project in the current directory and run `python setup.py develop\' after creating the virtualenv. Dependencies are installed from wheels, which are built as necessary and kept in a local wheelhouse. The changes made to the virtualenv by installing them are cached as a snapshot, which is cloned into the virtualenv the next time the same requirements are installed for the same interpreter. The maximum size of these snapshots can be set using the environment variable VENV_CLI_LAYER_CACHE_SIZE and defaults to 1G. This implies --recreate.')
+	parser.add_argument('-S', '--sync', action = 'store_true', help = 'Like --setup, but only if the interpreter, setup.py or requirements*.txt have changed since the virtualenv was last set up. If only setup.py or requirements*.txt have changed, the project and its dependencies are reinstalled into the existing virtualenv. Without --python, the interpreter used when the virtualenv was last set up is used again. This conflicts with --recreate and --setup.')
 	parser.add_argument('-n', '--no-activate', dest = 'activate', action = 'store_false', help = 'Do not activate the virtualenv. Implies --create.')
-	parser.add_argument('-p', '--python', type = str, default = None, help = 'The Python interpreter to use. Defaults to `python\'. Specifying this implies --recreate.')
+	parser.add_argument('-p', '--python', action = 'append', default = [], help = 'The Python interpreter to use. Either the name or path of an executable or an implementation and version prefix like `3.9\' or `pypy3\', which selects the interpreter with the highest matching version from those listed by --list-pythons. Defaults to `python\'. Specifying this implies --recreate. If specified multiple times, a virtualenv is created for each interpreter at the specified path with the interpreter\'s name appended, e.g. `venv-python3.9\'. This implies --no-activate and conflicts with --setup.')
+	parser.add_argument('-m', '--matrix', type = str, default = None, metavar = 'FILE', help = 'Create the virtualenvs listed in the specified file in parallel. Each line contains the name of an interpreter and optionally the path of the virtualenv, which defaults to the same path as when --python is specified multiple times. This implies --recreate and --no-activate and conflicts with --python and --setup.')
 	parser.add_argument('-t', '--test', action = 'store_true', help = 'Test whether the specified path is a virtualenv and print a message. If the specified path is not a virtualenv, the exit status will be set to 1. This option conflicts with --create, --recreate, --setup and --no-activate.')
+	parser.add_argument('--deep', action = 'store_true', help = 'With --test, also check that the interpreter the virtualenv has been created for still exists and has the same version, without starting it. Requires --test.')
+	parser.add_argument('-f', '--find-links', action = 'append', default = [], metavar = 'DIR', help = 'Build missing dependency wheels for --setup from packages in this directory instead of from the package index. Can be specified multiple times.')
+	parser.add_argument('-j', '--jobs', type = int, default = None, help = 'Number of dependency wheels or, with --matrix or multiple --python options, virtualenvs which are built in parallel. Defaults to the number of CPUs.')
+	parser.add_argument('--staged', action = 'store_true', help = 'Build a new virtualenv next to the specified path and only replace an existing virtualenv once the new one is complete. Without this option, an existing virtualenv is moved away before the new one is built.')
+	parser.add_argument('--lock-timeout', type = float, default = 600, metavar = 'SECONDS', help = 'Number of seconds to wait for another process which is creating the same virtualenv. The virtualenv created by that process is then used instead of creating it again. Defaults to 600.')
+	parser.add_argument('--engine', choices = ['virtualenv', 'stdlib'], default = 'virtualenv', help = 'How virtualenvs and cached templates are created. `virtualenv\' runs the virtualenv command. `stdlib\' uses the venv module of the standard library, within this process if the interpreter is the one running this command. Defaults to `virtualenv\'.')
+	parser.add_argument('--no-cache', dest = 'use_cache', action = 'store_false', help = 'Run virtualenv instead of copying a cached template when creating the virtualenv and, with --setup, install the dependencies instead of restoring them from a cached snapshot.')
+	parser.add_argument('--list-cache', action = 'store_true', help = 'List the cached virtualenv templates and dependency layers and exit.')
+	parser.add_argument('--purge-cache', action = 'store_true', help = 'Remove all cached virtualenv templates and dependency layers and exit.')
+	parser.add_argument('--timings', action = 'store_true', help = 'Print how long each phase of this invocation took. This can also be enabled by setting the environment variable VENV_CLI_TIMINGS to a non-empty value. The timings of every invocation which does not only activate or test an existing virtualenv are also added to a history, unless they are enabled by the environment variable, in which case all invocations are added.')
+	parser.add_argument('--shell-init', action = 'store_true', help = 'Print the definition of a shell function named `venv\' and exit. Add `eval "$(venv --shell-init)"\' to ~/.bashrc to use it. The function activates virtualenvs in the current shell instead of starting a new one and only runs this command when a virtualenv needs to be created or set up.')
+	parser.add_argument('--activate-fd', type = int, default = None, help = argparse.SUPPRESS)
+	parser.add_argument('--scan', type = str, default = None, metavar = 'DIR', help = 'Search the specified directory for virtualenvs and print a JSON object describing each of them on a separate line, with the keys `path\', `interpreter\', `implementation\', `version\', `healthy\', `problems\' and `size\', then exit. The virtualenvs are inspected in parallel, as with --test --deep, and each line is printed as soon as possible.')
+	parser.add_argument('--gc', type = str, default = None, metavar = 'DIR', help = 'Remove the directories below the specified directory which have been left behind by interrupted invocations and, as specified by --max-age and --budget, virtualenvs which are no longer used, then exit. A virtualenv counts as used when it is activated or when a command is run in it using this program. Directories which are currently being created by another invocation are skipped.')
+	parser.add_argument('--max-age', type = float, default = None, metavar = 'DAYS', help = 'With --gc, also remove virtualenvs which have not been used for this number of days.')
+	parser.add_argument('--budget', type = str, default = None, metavar = 'SIZE', help = 'With --gc, also remove the least recently used virtualenvs until the remaining ones take up at most this much space, e.g. `10G\'.')
+	parser.add_argument('--dry-run', action = 'store_true', help = 'With --gc, only print which directories would be removed and how much space this would free.')
+	parser.add_argument('--dedup', type = str, default = None, metavar = 'DIR', help = 'Replace identical files in the virtualenvs below the specified directory with hardlinks to a single copy in a content-addressed store in the cache directory, print how much space this freed and exit. Shared files are made read-only, so that they cannot be modified in place in one virtualenv. Files which are known to be modified in place, like .pth files, are only shared using reflinks, if the file system supports them.')
+	parser.add_argument('--shared', action = 'store_true', help = 'After creating a virtualenv, share its files with other virtualenvs using the store, as --dedup does.')
+	parser.add_argument('--pool-daemon', action = 'store_true', help = 'Run a daemon which keeps spare virtualenvs for the interpreters specified by --python and the engine specified by --engine, and for any other interpreters requested later. Virtualenvs created while the daemon is running are claimed from these spares, which only requires moving them into place, unless --no-cache is specified. The daemon listens on a unix socket in the cache directory. The number of spares follows the observed demand.')
+	parser.add_argument('--pool-size', type = int, default = None, metavar = 'N', help = 'With --pool-daemon, the maximum number of spare virtualenvs kept for each interpreter. Defaults to 4.')
+	parser.add_argument('--pool-status', action = 'store_true', help = 'Print the number of spare virtualenvs kept by the pool daemon and their target number for each interpreter and exit.')
+	parser.add_argument('--export', dest = 'export_file', type = str, default = None, metavar = 'FILE', help = 'Write the virtualenv to a tar archive at the specified path, or to stdout for `-\', and exit. The archive is compressed according to the suffix of the path, `.tar\', `.tar.gz\', `.tgz\', `.tar.bz2\', `.tar.xz\' or `.txz\', and with gzip otherwise. It contains a manifest of the files which refer to the path of the virtualenv.')
+	parser.add_argument('--import', dest = 'import_file', type = str, default = None, metavar = 'FILE', help = 'Replace the virtualenv with the one in an archive written by --export, or read from stdin for `-\', before activating it. The files listed in the manifest are rewritten to refer to the new path. The prompt is not changed. The virtualenv only works if the interpreter it has been created for exists at the same path. This conflicts with --create, --recreate, --setup, --sync, --python, --matrix and --test.')
+	parser.add_argument('--clone', type = Virtualenv, default = None, metavar = 'SOURCE', help = 'Replace the virtualenv with a copy of the virtualenv at the specified path before activating it. Files are copied using reflinks, if the file system supports them, and never hardlinked. The files which refer to the path of the copied virtualenv are rewritten to refer to the new path. The prompt is not changed. This conflicts with --create, --recreate, --setup, --sync, --python, --matrix, --test and --import.')
+	parser.add_argument('--list-pythons', action = 'store_true', help = 'List the interpreters found on the PATH and in common installation directories and exit. The version of each interpreter is cached for as long as its executable does not change.')
+	parser.add_argument('--stats', action = 'store_true', help = 'Print the median and 95th percentile of the duration of each phase across the invocations in the history and exit.')
 	
 	parser.add_argument('virtualenv', nargs = '?', type = Virtualenv, default = Virtualenv('venv'), help = 'Path to the virtualenv to operate on. Defaults to `venv\'')
 	
 	args = parser.parse_args()
 	
+	if args.pool_daemon:
+		if args.create or args.recreate or args.setup or args.sync or args.matrix or args.test or not args.activate:
+			parser.error('--pool-daemon can only be combined with --python, --engine and --pool-size.')
+		
+		from .interpreters import resolve_python
+		
+		args.pool_pythons = [resolve_python(i) for i in args.python] or ['python']
+		args.python = []
+		args.activate = False
+	elif args.pool_size is not None:
+		parser.error('--pool-size can only be specified together with --pool-daemon.')
+	else:
+		args.pool_pythons = []
+	
+	if args.pool_size is None:
+		args.pool_size = 4
+	
+	if args.import_file is not None and (args.create or args.recreate or args.setup or args.sync or args.python or args.matrix or args.test):
+		parser.error('--import conflicts with --create, --recreate, --setup, --sync, --python, --matrix and --test.')
+	
+	if args.clone is not None and (args.create or args.recreate or args.setup or args.sync or args.python or args.matrix or args.test or args.import_file is not None):
+		parser.error('--clone conflicts with --create, --recreate, --setup, --sync, --python, --matrix, --test and --import.')
+	
+	if args.list_cache or args.purge_cache or args.scan is not None or args.gc is not None or args.dedup is not None or args.export_file is not None or args.pool_status or args.list_pythons or args.stats or args.shell_init:
+		if args.create or args.recreate or args.setup or args.python or args.matrix or args.test or not args.activate:
+			parser.error('--list-cache, --purge-cache, --scan, --gc, --dedup, --export, --pool-status, --list-pythons, --stats and --shell-init cannot be combined with other options.')
+		
+		args.activate = False
+	
 	if args.setup:
 		# --setup and --python imply --recreate
 		args.recreate = True
 	
-	if args.python:
-		# --python implies --recreate
-		args.recreate = True
+	if args.matrix:
+		from .matrix import read_matrix_file
+		
+		if args.python:
+			parser.error('--matrix cannot be combined with --python.')
+		
+		args.targets = read_matrix_file(args.matrix, args.virtualenv.path)
+	elif len(args.python) > 1:
+		from .matrix import matrix_targets
+		
+		args.targets = matrix_targets(args.python, args.virtualenv.path)
 	else:
-		args.python = 'python'
+		args.targets = []
+	
+	del args.matrix
+	
+	target_paths = [os.path.abspath(j.path) for i, j in args.targets]
+	
+	for i in sorted(set(target_paths)):
+		if target_paths.count(i) > 1:
+			# E.g. `-p /usr/bin/python3 -p /opt/python/bin/python3', as the virtualenvs are named after the basename of the interpreter.
+			parser.error('Multiple virtualenvs would be created at {}.'.format(os.path.relpath(i)))
+	
+	if args.setup and args.targets:
+		# The virtualenvs are created in parallel and `python setup.py develop' writes to the same directory for each of them.
+		parser.error('--setup cannot be combined with --matrix or multiple --python options.')
+	
+	if args.python or args.targets:
+		from .interpreters import resolve_python
+		
+		# Report unknown interpreters before doing any work.
+		args.python = [resolve_python(i) for i in args.python]
+		args.targets = [(resolve_python(i), j) for i, j in args.targets]
+	
+	if args.targets:
+		# Multiple virtualenvs cannot be activated.
+		args.activate = False
+	
+	if args.sync:
+		if args.recreate or args.setup or args.test or args.targets:
+			parser.error('--sync cannot be combined with --recreate, --setup, --test, --matrix or multiple --python options.')
+		
+		# Whether the virtualenv needs to be recreated is decided by the fingerprint.
+		args.python = args.python[0] if args.python else None
+		args.create = True
+	else:
+		if args.python or args.targets:
+			# --python implies --recreate
+			args.recreate = True
+		
+		args.python = args.python[0] if len(args.python) == 1 else 'python'
 	
 	if args.recreate:
 		# --recreate implies --recreate
 		args.create = True
 	
-	if not args.activate and not args.test:
+	if not args.activate and not args.test and not args.list_cache and not args.purge_cache and args.scan is None and args.gc is None and args.dedup is None and args.export_file is None and not args.pool_daemon and not args.pool_status and not args.list_pythons and not args.stats and not args.shell_init:
 		# Not specifying --activate or --test implies --create 
 		args.create = True
 	
 	if args.create and args.test:
 		parser.error('--test cannot be specified if any of --create, --recreate, --setup, --python or --no-activate are specified.')
 	
+	if args.gc is None and (args.max_age is not None or args.budget is not None or args.dry_run):
+		parser.error('--max-age, --budget and --dry-run can only be specified together with --gc.')
+	
+	if args.budget is not None:
+		from .cache import parse_size
+		
+		args.budget = parse_size(args.budget)
+	
+	if args.deep and not args.test:
+		parser.error('--deep can only be specified together with --test.')
+	
 	if args.test:
 		if not args.activate:
 			parser.error('--no-activate cannot be specified if --test is specified.')
@@ -216,47 +797,294 @@ def parse_args():
 	return args
 
 
-def main(create : bool, recreate : bool, setup : bool, activate : bool, python : str, virtualenv : Virtualenv, test : bool):
-	if test:
-		if virtualenv.is_virtualenv:
+def test_virtualenv(virtualenv : Virtualenv, deep : bool = False):
+	with span('test'):
+		# A virtualenv whose interpreter has been removed is only recognized as such by the deep check.
+		if virtualenv.is_virtualenv or deep and virtualenv.pyvenv_cfg is not None:
+			if deep:
+				problems = virtualenv.health_problems()
+				
+				if problems:
+					raise UserError('{} is a broken virtualenv: {}.', virtualenv.path, '; '.join(problems))
+			
 			log('{} is a virtualenv running {}.', virtualenv.path, virtualenv.python_version_string)
 		elif virtualenv.path_exists:
 			raise UserError('{} is not a virtualenv.', virtualenv.path)
 		else:
 			raise UserError('{} does not exist.', virtualenv.path)
+
+
+def activate_virtualenv(virtualenv : Virtualenv, script_fd : int = None):
+	if not virtualenv.path_exists:
+		raise UserError('{} does not exist.', virtualenv.path)
+	elif not virtualenv.is_virtualenv:
+		raise UserError('{} is not a virtualenv.', virtualenv.path)
+	
+	with span('python_version'):
+		version = virtualenv.python_version_string
+	
+	log('Activating virtualenv {} running {}.', virtualenv.path, version)
+	
+	virtualenv.activate(script_fd)
+
+
+def exec_in_virtualenv(args : list):
+	"""
+	Handle `venv exec [path] -- command [args...]'.
+	"""
+	
+	if '--' not in args:
+		raise UserError('Usage: venv exec [path] -- command [args...]', exit_code = 2)
+	
+	separator = args.index('--')
+	paths, command_args = args[:separator], args[separator + 1:]
+	
+	if len(paths) > 1 or not command_args:
+		raise UserError('Usage: venv exec [path] -- command [args...]', exit_code = 2)
+	
+	virtualenv = Virtualenv(paths[0] if paths else 'venv')
+	
+	if not virtualenv.path_exists:
+		raise UserError('{} does not exist.', virtualenv.path)
+	elif not virtualenv.is_virtualenv:
+		raise UserError('{} is not a virtualenv.', virtualenv.path)
+	
+	virtualenv.exec_command(command_args)
+
+
+def print_template_cache():
+	from .cache import format_size
+	from .layers import layer_cache
+	from .templates import template_cache
+	
+	for i in template_cache().entries() + layer_cache().entries():
+		print('{}  {:>10}  {}'.format(i.key[:12], format_size(i.size), i.description))
+
+
+def purge_template_cache():
+	from .cache import format_size
+	from .layers import layer_cache
+	from .templates import template_cache
+	
+	templates = template_cache().purge()
+	layers = layer_cache().purge()
+	
+	log('Removed {} cached templates and {} dependency layers, {} in total.', len(templates), len(layers), format_size(sum(i.size for i in templates + layers)))
+
+
+def check_parent_dir(virtualenv : Virtualenv):
+	parent_dir = os.path.dirname(os.path.abspath(virtualenv.path))
+	
+	if not os.path.exists(parent_dir):
+		raise UserError('Parent {} does not exist.', os.path.dirname(virtualenv.path))
+	elif not os.path.isdir(parent_dir):
+		raise UserError('Parent {} is not a directory.', os.path.dirname(virtualenv.path))
+
+
+def _virtualenv_identity(virtualenv : Virtualenv):
+	"""
+	Return a value which changes whenever the virtualenv is created anew or None, if there is no virtualenv.
+	"""
+	
+	try:
+		# This file is written anew whenever a virtualenv is created.
+		st = os.stat(os.path.join(virtualenv.path, 'bin', 'activate'))
+	except OSError:
+		return None
+	
+	return st.st_ino, st.st_mtime_ns
+
+
+def create_virtualenv(virtualenv : Virtualenv, python : str, recreate : bool, setup : bool, use_cache : bool, find_links : list, jobs : int, staged : bool, engine : str, shared : bool, lock_timeout : float):
+	"""
+	Create the virtualenv, unless one already exists and recreate is not set.
+	
+	The virtualenv is locked while it is created. If another process is creating it at the same time, this waits for up to lock_timeout seconds for that process to finish and then uses the virtualenv it created.
+	"""
+	
+	from .lock import locked_path
+	
+	check_parent_dir(virtualenv)
+	
+	if virtualenv.is_virtualenv and not recreate:
+		return
+	
+	identity = _virtualenv_identity(virtualenv)
+	
+	with locked_path(virtualenv.path, lock_timeout) as waited:
+		if waited and virtualenv.is_virtualenv and (not recreate or _virtualenv_identity(virtualenv) != identity):
+			log('Using {}, which has been created by another process.', virtualenv.path)
+		else:
+			_create_virtualenv(virtualenv, python, recreate, setup, use_cache, find_links, jobs, staged, engine, shared)
+
+
+def _create_virtualenv(virtualenv : Virtualenv, python : str, recreate : bool, setup : bool, use_cache : bool, find_links : list, jobs : int, staged : bool, engine : str, shared : bool):
+	if not virtualenv.is_virtualenv or recreate:
+		if virtualenv.path_exists and not virtualenv.is_virtualenv:
+			raise UserError('{} is not a virtualenv.', virtualenv.path)
+		
+		# Both engines put the prompt in parentheses.
+		prompt = os.path.basename(os.path.dirname(os.path.abspath(virtualenv.path)))
+		
+		virtualenv.create(python, prompt, setup, use_cache, find_links, jobs, staged, engine, use_pool = use_cache)
+		
+		if setup:
+			from .sync import write_fingerprint
+			
+			with span('fingerprint'):
+				write_fingerprint(virtualenv, python)
+		
+		if shared:
+			from .dedup import share_virtualenv
+			
+			with span('dedup'):
+				share_virtualenv(virtualenv.path, jobs)
+
+
+def main(create : bool, recreate : bool, setup : bool, sync : bool, activate : bool, python : str, virtualenv : Virtualenv, targets : list, test : bool, deep : bool, use_cache : bool, find_links : list, jobs : int, staged : bool, engine : str, shared : bool, list_cache : bool, purge_cache : bool, scan : str, gc : str, max_age : float, budget : int, dry_run : bool, dedup : str, export_file : str, import_file : str, clone : Virtualenv, pool_daemon : bool, pool_pythons : list, pool_size : int, pool_status : bool, list_pythons : bool, timings : bool, stats : bool, shell_init : bool, activate_fd : int, lock_timeout : float):
+	if timings:
+		_timings.report = True
+	
+	if list_cache:
+		print_template_cache()
+	elif purge_cache:
+		purge_template_cache()
+	elif scan is not None:
+		from .scan import scan_tree
+		
+		scan_tree(scan, jobs)
+	elif gc is not None:
+		from .cleanup import collect_garbage
+		
+		collect_garbage(gc, max_age, budget, dry_run, jobs)
+	elif dedup is not None:
+		from .dedup import dedup_tree
+		
+		dedup_tree(dedup, jobs)
+	elif export_file is not None:
+		from .archive import export_virtualenv
+		
+		export_virtualenv(virtualenv, export_file, lock_timeout)
+	elif pool_daemon:
+		from .pool import run_pool_daemon
+		
+		run_pool_daemon(pool_pythons, engine, pool_size)
+	elif pool_status:
+		from .pool import print_pool_status
+		
+		print_pool_status()
+	elif list_pythons:
+		from .interpreters import print_interpreters
+		
+		print_interpreters()
+	elif stats:
+		from .timings import print_stats
+		
+		print_stats()
+	elif shell_init:
+		from .shell_init import print_shell_init
+		
+		print_shell_init()
+	elif test:
+		test_virtualenv(virtualenv, deep)
+	elif targets:
+		from .matrix import create_matrix
+		
+		create_matrix(targets, lambda x, y: create_virtualenv(y, x, recreate, setup, use_cache, find_links, jobs, staged, engine, shared, lock_timeout), jobs)
 	else:
-		parent_dir = os.path.dirname(os.path.abspath(virtualenv.path))
-		prompt = '({}) '.format(os.path.basename(parent_dir))
-		
-		if not os.path.exists(parent_dir):
-			raise UserError('Parent {} does not exist.', os.path.dirname(virtualenv.path))
-		elif not os.path.isdir(parent_dir):
-			raise UserError('Parent {} is not a directory.', os.path.dirname(virtualenv.path))
-		
-		if create:
-			if not virtualenv.is_virtualenv or recreate:
-				if virtualenv.path_exists and not virtualenv.is_virtualenv:
-					raise UserError('{} is not a virtualenv.', virtualenv.path)
-				
-				virtualenv.create(python, prompt, setup)
+		check_parent_dir(virtualenv)
 		
-		if activate:
-			if not virtualenv.path_exists:
-				raise UserError('{} does not exist.', virtualenv.path)
-			elif not virtualenv.is_virtualenv:
-				raise UserError('{} is not a virtualenv.', virtualenv.path)
+		if import_file is not None:
+			from .archive import import_virtualenv
 			
-			log('Activating virtualenv {} running {}.', virtualenv.path, virtualenv.python_version_string)
+			import_virtualenv(virtualenv, import_file, lock_timeout)
+		elif clone is not None:
+			from .clone import clone_virtualenv
 			
-			virtualenv.activate()
+			clone_virtualenv(clone, virtualenv, lock_timeout)
+		elif sync:
+			from .lock import locked_path
+			from .sync import sync_virtualenv
+			
+			# Another process which synced the virtualenv while this one was waiting has left it up to date.
+			with locked_path(virtualenv.path, lock_timeout):
+				sync_virtualenv(virtualenv, python, lambda x: _create_virtualenv(virtualenv, x, True, True, use_cache, find_links, jobs, staged, engine, shared), find_links, jobs)
+		elif create:
+			create_virtualenv(virtualenv, python, recreate, setup, use_cache, find_links, jobs, staged, engine, shared, lock_timeout)
+		
+		if activate:
+			activate_virtualenv(virtualenv, activate_fd)
+
+
+def main_fast(args : list):
+	"""
+	Handle the common invocations which only activate or test an existing virtualenv, run a command in one or only print something without building the argument parser. Returns False, if the arguments need to be handled by main().
+	"""
+	
+	if args[:1] == ['exec']:
+		exec_in_virtualenv(args[1:])
+		
+		return True
+	
+	if args == ['--shell-init']:
+		from .shell_init import print_shell_init
+		
+		print_shell_init()
+		
+		return True
+	
+	if args == ['--list-pythons']:
+		from .interpreters import print_interpreters
+		
+		print_interpreters()
+		
+		return True
+	
+	paths = [i for i in args if not i.startswith('-')]
+	options = set(args) - set(paths)
+	
+	test = bool(options & { '-t', '--test' })
+	
+	if len(paths) > 1 or not options <= { '-t', '--test', '--deep' } or '--deep' in options and not test:
+		return False
+	
+	virtualenv = Virtualenv(paths[0] if paths else 'venv')
+	
+	if test:
+		test_virtualenv(virtualenv, '--deep' in options)
+	elif virtualenv.is_virtualenv:
+		activate_virtualenv(virtualenv)
+	else:
+		# Let main() report the error.
+		return False
+	
+	return True
 
 
 def script_main():
+	status = 0
+	
+	# Recording the timings is skipped for the fast path unless requested, as it would slow it down noticeably.
+	if os.environ.get('VENV_CLI_TIMINGS'):
+		start_timings(True)
+	
 	try:
-		main(**vars(parse_args()))
+		if not main_fast(sys.argv[1:]):
+			if _timings is None:
+				start_timings(False)
+			
+			with span('parse_args'):
+				args = parse_args()
+			
+			main(**vars(args))
 	except UserError as e:
 		log('Error: {}', e)
-		sys.exit(e.exit_code)
+		status = e.exit_code
 	except KeyboardInterrupt:
 		log('Operation interrupted.')
-		sys.exit(2)
+		status = 2
+	
+	finish_timings(status)
+	
+	if status:
+		sys.exit(status)
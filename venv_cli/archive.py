@@ -0,0 +1,269 @@
+import os, sys, io, json, stat, shutil, tarfile
+
+from . import UserError, Virtualenv, backed_up_dir, span
+from .relocate import rewrite_references
+
+
+# Name of the member which lists the files which contain the path of the virtualenv. It is written last, as these are only known once all files have been read.
+_manifest_name = 'manifest.json'
+
+# Name of the directory below which the files of the virtualenv are stored.
+_root_name = 'venv'
+
+# Compression used for archive paths ending with these suffixes, with options which favor speed over size. Other paths, including `-', use gzip.
+_compressions = [
+	('.tar', '', { }),
+	('.tar.gz', 'gz', dict(compresslevel = 1)),
+	('.tgz', 'gz', dict(compresslevel = 1)),
+	('.tar.bz2', 'bz2', dict(compresslevel = 1)),
+	('.tar.xz', 'xz', dict(preset = 1)),
+	('.txz', 'xz', dict(preset = 1))]
+
+
+class _ScanningReader:
+	"""
+	Wraps a file and records, while it is read, whether its content contains needle and no null bytes, i.e. whether find_references() would report it.
+	"""
+	
+	def __init__(self, file, needle : bytes):
+		self.file = file
+		self.needle = needle
+		self.found = False
+		self.binary = False
+		
+		# The end of the previous chunk, in case the needle spans two chunks.
+		self.tail = b''
+	
+	def read(self, size = -1):
+		data = self.file.read(size)
+		
+		if not self.binary:
+			window = self.tail + data
+			self.binary = b'\0' in data
+			self.found = self.found or self.needle in window
+			self.tail = window[len(window) - len(self.needle) + 1:]
+		
+		return data
+	
+	@property
+	def is_reference(self):
+		return self.found and not self.binary
+
+
+def _tar_info(name, path, st):
+	"""
+	Return a TarInfo for a directory, regular file or symlink or None for other file types. Hardlinks are stored as separate files and owners are not stored, so that the archive can be extracted anywhere.
+	"""
+	
+	info = tarfile.TarInfo(name)
+	info.mode = stat.S_IMODE(st.st_mode)
+	
+	# Compiled bytecode only records whole seconds of the source's modification time. This avoids a PAX header for most members.
+	info.mtime = int(st.st_mtime)
+	
+	if stat.S_ISDIR(st.st_mode):
+		info.type = tarfile.DIRTYPE
+	elif stat.S_ISLNK(st.st_mode):
+		info.type = tarfile.SYMTYPE
+		info.linkname = os.readlink(path)
+	elif stat.S_ISREG(st.st_mode):
+		info.size = st.st_size
+	else:
+		return None
+	
+	return info
+
+
+def _open_for_writing(path, name):
+	"""
+	Open an archive for writing to path, or to stdout for `-', using the compression selected by the suffix of name.
+	"""
+	
+	for suffix, compression, options in _compressions:
+		if name.endswith(suffix):
+			break
+	else:
+		compression, options = 'gz', dict(compresslevel = 1)
+	
+	# Unlike the stream modes, this allows setting the compression level. The archive is still written sequentially.
+	if path == '-':
+		return tarfile.open(fileobj = sys.stdout.buffer, mode = 'w:' + compression, **options)
+	else:
+		return tarfile.open(path, 'w:' + compression, **options)
+
+
+def _open_for_reading(path):
+	"""
+	Open an archive at the specified path, or stdin for `-', for reading it sequentially with any compression.
+	"""
+	
+	if path == '-':
+		return tarfile.open(fileobj = sys.stdin.buffer, mode = 'r|*')
+	else:
+		return tarfile.open(path, 'r|*')
+
+
+def _write_archive(tar, root):
+	origin = os.path.abspath(root)
+	needle = origin.encode()
+	references = []
+	
+	for dirpath, dirnames, filenames in os.walk(root):
+		dirnames.sort()
+		
+		# Directories are written before their contents, so that the archive can be extracted in order.
+		for i in dirnames + sorted(filenames):
+			path = os.path.join(dirpath, i)
+			relative_path = os.path.relpath(path, root)
+			info = _tar_info('{}/{}'.format(_root_name, relative_path), path, os.lstat(path))
+			
+			if info is None:
+				continue
+			elif info.isreg():
+				with open(path, 'rb') as file:
+					reader = _ScanningReader(file, needle)
+					tar.addfile(info, reader)
+				
+				if reader.is_reference:
+					references.append(relative_path)
+			else:
+				tar.addfile(info)
+				
+				if info.issym() and needle in os.fsencode(info.linkname):
+					references.append(relative_path)
+	
+	manifest = json.dumps(dict(origin = origin, references = references)).encode()
+	info = tarfile.TarInfo(_manifest_name)
+	info.size = len(manifest)
+	
+	tar.addfile(info, io.BytesIO(manifest))
+
+
+def _member_path(info, file):
+	"""
+	Return the path of a member below the virtualenv, relative to it. Raises UserError for members which were not written by _write_archive().
+	"""
+	
+	parts = info.name.split('/')
+	
+	if parts[0] != _root_name or len(parts) < 2 or any(i in ('', '.', '..') for i in parts[1:]) or not (info.isdir() or info.isreg() or info.issym()):
+		raise UserError('{} contains an unexpected member {}.', file, info.name)
+	
+	return os.path.join(*parts[1:])
+
+
+def _extract_archive(tar, root, file):
+	"""
+	Extract the files of the virtualenv in the archive to root, which must not exist, in the order in which they are read. Returns the manifest.
+	"""
+	
+	manifest = None
+	
+	# Paths of the extracted symlinks and files, relative to root.
+	symlinks = set()
+	files = set()
+	
+	os.mkdir(root)
+	
+	for info in tar:
+		if info.name == _manifest_name:
+			manifest = json.loads(tar.extractfile(info).read().decode())
+			
+			continue
+		
+		relative_path = _member_path(info, file)
+		path = os.path.join(root, relative_path)
+		parent = os.path.dirname(relative_path)
+		
+		# Otherwise, a member could be written through a symlink to a path outside of root.
+		while parent:
+			if parent in symlinks:
+				raise UserError('{} contains a member {} below a symlink.', file, info.name)
+			
+			parent = os.path.dirname(parent)
+		
+		if info.isdir():
+			os.mkdir(path)
+			os.chmod(path, info.mode | 0o700)
+		elif info.issym():
+			os.symlink(info.linkname, path)
+			symlinks.add(relative_path)
+			files.add(relative_path)
+		else:
+			with tar.extractfile(info) as source, open(path, 'xb') as target:
+				shutil.copyfileobj(source, target, 1 << 20)
+			
+			# Files shared by --dedup are read-only, but the extracted ones are not shared.
+			os.chmod(path, info.mode | 0o200)
+			os.utime(path, (info.mtime, info.mtime))
+			files.add(relative_path)
+	
+	if manifest is None:
+		raise UserError('{} contains no manifest, it has not been written by --export.', file)
+	
+	for i in manifest['references']:
+		if i not in files:
+			raise UserError('The manifest of {} refers to {}, which is not a member.', file, i)
+	
+	return manifest
+
+
+def export_virtualenv(virtualenv : Virtualenv, file, lock_timeout : float):
+	"""
+	Write the virtualenv to a compressed tar archive at the specified path or, for `-', to stdout. The archive also contains a manifest of the files which contain the path of the virtualenv, so that import_virtualenv() can rewrite them.
+	
+	Each file is read only once, while it is written to the archive, and the manifest is written last, so this needs constant memory. An existing archive is only replaced once the new one is complete.
+	"""
+	
+	from .lock import locked_path
+	
+	# Wait for another process which is creating the virtualenv.
+	with locked_path(virtualenv.path, lock_timeout):
+		if not virtualenv.path_exists:
+			raise UserError('{} does not exist.', virtualenv.path)
+		elif not virtualenv.is_virtualenv:
+			raise UserError('{} is not a virtualenv.', virtualenv.path)
+		
+		temp_path = file if file == '-' else file + '~venv_cli_partial'
+		
+		with span('export'):
+			try:
+				with _open_for_writing(temp_path, file) as tar:
+					_write_archive(tar, virtualenv.path)
+				
+				if temp_path != file:
+					os.replace(temp_path, file)
+			except OSError as e:
+				raise UserError('Writing {} failed: {}', file, e)
+			finally:
+				if temp_path != file and os.path.exists(temp_path):
+					os.unlink(temp_path)
+
+
+def import_virtualenv(virtualenv : Virtualenv, file, lock_timeout : float):
+	"""
+	Replace the virtualenv with the one in an archive written by export_virtualenv() at the specified path or, for `-', read from stdin. The files are extracted while the archive is read, after which the files listed in the manifest are rewritten to refer to the path of the virtualenv.
+	
+	If the archive cannot be read or the imported virtualenv is broken, e.g. because its interpreter does not exist on this machine, an existing virtualenv is restored.
+	"""
+	
+	from .lock import locked_path
+	
+	with locked_path(virtualenv.path, lock_timeout):
+		if virtualenv.path_exists and not virtualenv.is_virtualenv:
+			raise UserError('{} is not a virtualenv.', virtualenv.path)
+		
+		with span('import'), backed_up_dir(virtualenv.path):
+			try:
+				with _open_for_reading(file) as tar:
+					manifest = _extract_archive(tar, virtualenv.path, file)
+			except (tarfile.TarError, EOFError, OSError, ValueError, KeyError) as e:
+				raise UserError('Importing {} failed: {}', file, e)
+			
+			with span('relocate'):
+				rewrite_references(virtualenv.path, manifest['references'], [(manifest['origin'], os.path.abspath(virtualenv.path))])
+			
+			problems = virtualenv.health_problems()
+			
+			if problems:
+				raise UserError('The virtualenv imported from {} is broken: {}.', file, '; '.join(problems))
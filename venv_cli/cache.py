@@ -0,0 +1,274 @@
+import os, json, time, hashlib, tempfile
+
+from . import UserError, rm_temp
+
+
+def cache_dir(*names):
+	"""
+	Return the path of a directory within the venv_cli cache directory. The directory is not created.
+	"""
+	
+	root = os.environ.get('VENV_CLI_CACHE_DIR')
+	
+	if not root:
+		root = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'venv_cli')
+	
+	return os.path.join(root, *names)
+
+
+_size_units = { '': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40 }
+
+
+def parse_size(string : str):
+	"""
+	Parse a size like `500M` or `2G` into a number of bytes.
+	"""
+	
+	number = string.strip().lower().rstrip('ib')
+	unit = number[-1:] if number[-1:] in _size_units else ''
+	
+	try:
+		return int(float(number[:len(number) - len(unit)]) * _size_units[unit])
+	except ValueError:
+		raise UserError('Invalid size: {}', string)
+
+
+def format_size(size : int):
+	for unit in ['', 'K', 'M', 'G', 'T']:
+		if size < 1 << 10:
+			break
+		
+		size /= 1 << 10
+	else:
+		unit = 'P'
+	
+	return '{:.1f} {}B'.format(size, unit)
+
+
+def tree_size(path):
+	"""
+	Return the number of bytes used by the regular files below the specified directory. Symlinks are not followed and hardlinked files are counted once.
+	"""
+	
+	size = 0
+	seen = set()
+	
+	for dirpath, dirnames, filenames in os.walk(path):
+		for i in filenames:
+			st = os.lstat(os.path.join(dirpath, i))
+			
+			if (st.st_dev, st.st_ino) not in seen:
+				seen.add((st.st_dev, st.st_ino))
+				size += st.st_size
+	
+	return size
+
+
+def write_json(path, data):
+	"""
+	Atomically replace the file at the specified path with the JSON representation of data.
+	"""
+	
+	fd, temp_path = tempfile.mkstemp(dir = os.path.dirname(path), prefix = '.{}~'.format(os.path.basename(path)))
+	
+	with open(fd, 'w', encoding = 'utf-8') as file:
+		json.dump(data, file, indent = 1, sort_keys = True)
+	
+	os.rename(temp_path, path)
+
+
+def read_json(path, default = None):
+	try:
+		with open(path, 'r', encoding = 'utf-8') as file:
+			return json.load(file)
+	except (OSError, ValueError):
+		return default
+
+
+class CacheEntry:
+	def __init__(self, key, path, metadata : dict, last_used : float):
+		self.key = key
+		self.path = path
+		self.metadata = metadata
+		self.last_used = last_used
+	
+	@property
+	def size(self):
+		return self.metadata.get('size', 0)
+	
+	@property
+	def description(self):
+		return self.metadata.get('description', '')
+
+
+class DirectoryCache:
+	"""
+	A directory of cache entries, each of which is a directory identified by a key. When an entry is stored, entries are evicted in least-recently-used order until the total size is within the limit.
+	"""
+	
+	_metadata_name = 'entry.json'
+	
+	def __init__(self, path, max_size : int):
+		self.path = path
+		self.max_size = max_size
+	
+	@classmethod
+	def key_for(cls, *parts):
+		return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:32]
+	
+	def _read_entry(self, key):
+		path = os.path.join(self.path, key)
+		metadata_path = os.path.join(path, self._metadata_name)
+		
+		try:
+			last_used = os.stat(metadata_path).st_mtime
+		except OSError:
+			return None
+		
+		return CacheEntry(key, path, read_json(metadata_path, { }), last_used)
+	
+	def lookup(self, key):
+		"""
+		Return the entry for the specified key or None, if there is no such entry. The entry is marked as recently used.
+		"""
+		
+		entry = self._read_entry(key)
+		
+		if entry is not None:
+			entry.last_used = time.time()
+			os.utime(os.path.join(entry.path, self._metadata_name), (entry.last_used, entry.last_used))
+		
+		return entry
+	
+	def store(self, key, populate):
+		"""
+		Create a new entry for the specified key. populate is called with the path to a new directory, which it should fill, and returns a dict which is stored as the entry's metadata. Returns the new entry.
+		
+		If another process stored an entry with the same key in the meantime, that entry is returned instead.
+		"""
+		
+		os.makedirs(self.path, exist_ok = True)
+		
+		temp_path = tempfile.mkdtemp(dir = self.path, prefix = '.{}~'.format(key))
+		
+		try:
+			metadata = dict(populate(temp_path))
+			metadata['size'] = tree_size(temp_path)
+			write_json(os.path.join(temp_path, self._metadata_name), metadata)
+			
+			try:
+				os.rename(temp_path, os.path.join(self.path, key))
+			except OSError:
+				if self._read_entry(key) is None:
+					raise
+		finally:
+			rm_temp(temp_path)
+		
+		self.evict(keep = key)
+		
+		return self.lookup(key)
+	
+	def entries(self):
+		"""
+		Return all entries, most recently used first.
+		"""
+		
+		if not os.path.isdir(self.path):
+			return []
+		
+		entries = [self._read_entry(i) for i in os.listdir(self.path) if not i.startswith('.')]
+		
+		return sorted((i for i in entries if i is not None), key = lambda x: x.last_used, reverse = True)
+	
+	def remove(self, entry : CacheEntry):
+		# Move the entry out of the way first so that it cannot be found half-deleted.
+		delete_path = tempfile.mkdtemp(dir = self.path, prefix = '.{}~delete~'.format(entry.key))
+		
+		try:
+			os.replace(entry.path, delete_path)
+		except FileNotFoundError:
+			pass
+		
+		rm_temp(delete_path)
+	
+	def evict(self, keep = None):
+		"""
+		Remove least recently used entries until the total size is within the limit. The entry with the key keep is never removed.
+		"""
+		
+		total_size = 0
+		
+		for i in self.entries():
+			total_size += i.size
+			
+			if total_size > self.max_size and i.key != keep:
+				self.remove(i)
+				total_size -= i.size
+	
+	def purge(self):
+		"""
+		Remove all entries and return them.
+		"""
+		
+		entries = self.entries()
+		
+		for i in entries:
+			self.remove(i)
+		
+		return entries
+
+
+def file_identity(path):
+	"""
+	Return a value which changes whenever the file at the specified path is replaced or modified.
+	"""
+	
+	st = os.stat(path)
+	
+	return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def memoize_for_file(path, name, compute):
+	"""
+	Return compute(), caching the result on disk for as long as the inode, size and modification time of the file at the specified path do not change.
+	
+	The result must be representable as JSON.
+	"""
+	
+	return memoize_for_files([path], name, lambda x: compute())[0]
+
+
+def memoize_for_files(paths : list, name, compute):
+	"""
+	Like memoize_for_file() but for multiple files at once. compute is called with the path of each file for which no result is cached. If there are multiple such files, this happens in parallel. Returns the list of results.
+	"""
+	
+	real_paths = [os.path.realpath(i) for i in paths]
+	identities = [file_identity(i) for i in real_paths]
+	cache_path = cache_dir('file_info.json')
+	data = read_json(cache_path, { })
+	entries = data.setdefault(name, { })
+	missing = [i for i, (real_path, identity) in enumerate(zip(real_paths, identities)) if entries.get(real_path, [None])[0] != identity]
+	
+	if not missing:
+		return [entries[i][1] for i in real_paths]
+	
+	if len(missing) == 1:
+		values = [compute(paths[missing[0]])]
+	else:
+		import concurrent.futures
+		
+		with concurrent.futures.ThreadPoolExecutor(os.cpu_count()) as executor:
+			values = list(executor.map(lambda x: compute(paths[x]), missing))
+	
+	for i, value in zip(missing, values):
+		entries[real_paths[i]] = [identities[i], value]
+	
+	try:
+		os.makedirs(os.path.dirname(cache_path), exist_ok = True)
+		write_json(cache_path, data)
+	except OSError:
+		# The cache is only an optimization.
+		pass
+	
+	return [entries[i][1] for i in real_paths]
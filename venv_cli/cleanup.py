@@ -0,0 +1,142 @@
+import os, re, time, shutil, concurrent.futures
+
+from . import UserError, Virtualenv, log
+from .cache import format_size, tree_size
+from .lock import locked_path_if_free
+from .scan import find_virtualenvs, looks_like_virtualenv
+
+
+# Suffixes of the directories left behind by backed_up_dir() and staged_dir() when the process is killed. removed_in_background() appends a random part to the suffix of the directories it deletes, e.g. `venv~venv_cli_backup~venv_cli_delete-1234abcd'.
+_leftover_suffixes = ('~venv_cli_backup', '~venv_cli_delete', '~venv_cli_staging')
+_leftover_pattern = re.compile('(.*?)((?:{})(?:-[0-9a-f]+)?)+$'.format('|'.join(map(re.escape, _leftover_suffixes))), re.DOTALL)
+
+
+class _Candidate:
+	def __init__(self, path, owner, last_used):
+		self.path = path
+		
+		# The virtualenv which needs to be locked before the directory can be removed.
+		self.owner = owner
+		self.last_used = last_used
+		self.size = None
+		self.reason = None
+
+
+def _last_used(path):
+	"""
+	Return the time at which the virtualenv at the specified path has last been used. This is the time it was last activated by this program or, if that is later, the time bin/activate was last read or the virtualenv was created.
+	"""
+	
+	times = []
+	
+	for i, use_atime in [(Virtualenv(path).last_used_path, False), (os.path.join(path, 'bin', 'activate'), True), (os.path.join(path, 'pyvenv.cfg'), False)]:
+		try:
+			st = os.stat(i)
+		except OSError:
+			continue
+		
+		times.append(st.st_atime if use_atime else st.st_mtime)
+	
+	return max(times, default = 0)
+
+
+def _leftover_owner(path):
+	"""
+	Return the path of the virtualenv for which the leftover directory at the specified path has been created or None, if it is not a leftover directory.
+	"""
+	
+	match = _leftover_pattern.match(path)
+	
+	return None if match is None else match.group(1)
+
+
+def _find_candidates(root):
+	"""
+	Return the lists of leftover directories and of virtualenvs below root.
+	"""
+	
+	leftovers = []
+	virtualenvs = []
+	
+	for i in find_virtualenvs(root, lambda x: _leftover_owner(x) is not None or looks_like_virtualenv(x)):
+		owner = _leftover_owner(i)
+		
+		if owner is None:
+			virtualenvs.append(_Candidate(i, i, _last_used(i)))
+		else:
+			leftovers.append(_Candidate(i, owner, None))
+	
+	return leftovers, virtualenvs
+
+
+def _remove(candidate):
+	"""
+	Remove the directory, unless its virtualenv is currently being created by another process. Returns whether it has been removed.
+	"""
+	
+	with locked_path_if_free(candidate.owner) as acquired:
+		if not acquired:
+			log('Skipping {}, which is in use by another process.', candidate.path)
+			
+			return False
+		
+		try:
+			shutil.rmtree(candidate.path)
+		except OSError as e:
+			log('Removing {} failed: {}', candidate.path, e)
+			
+			return False
+	
+	return True
+
+
+def collect_garbage(root, max_age : float = None, budget : int = None, dry_run : bool = False, jobs : int = None):
+	"""
+	Remove the directories below root which have been left behind by interrupted invocations, the virtualenvs which have not been used for max_age days and, while the virtualenvs take up more than budget bytes, the least recently used virtualenvs.
+	
+	The directories are measured and removed in parallel. If dry_run is set, they are only reported.
+	"""
+	
+	if not os.path.isdir(root):
+		raise UserError('{} is not a directory.', root)
+	
+	leftovers, virtualenvs = _find_candidates(root)
+	
+	with concurrent.futures.ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+		for i, size in zip(leftovers + virtualenvs, executor.map(lambda x: tree_size(x.path), leftovers + virtualenvs)):
+			i.size = size
+		
+		for i in leftovers:
+			i.reason = 'left behind by an interrupted invocation'
+		
+		now = time.time()
+		kept = []
+		
+		for i in sorted(virtualenvs, key = lambda x: x.last_used):
+			days = (now - i.last_used) / 86400
+			
+			if max_age is not None and days > max_age:
+				i.reason = 'not used for {:.0f} days'.format(days)
+			else:
+				kept.append(i)
+		
+		total_size = sum(i.size for i in kept)
+		
+		for i in kept:
+			if budget is None or total_size <= budget:
+				break
+			
+			i.reason = 'least recently used, virtualenvs exceed the budget of {}'.format(format_size(budget))
+			total_size -= i.size
+		
+		selected = [i for i in leftovers + virtualenvs if i.reason is not None]
+		
+		for i in selected:
+			log('{} {} ({}, {}).', 'Would remove' if dry_run else 'Removing', i.path, i.reason, format_size(i.size))
+		
+		if dry_run:
+			log('{} directories could be removed, {} in total.', len(selected), format_size(sum(i.size for i in selected)))
+		else:
+			removed = [i for i, j in zip(selected, executor.map(_remove, selected)) if j]
+			
+			log('Removed {} directories, {} in total.', len(removed), format_size(sum(i.size for i in removed)))
@@ -0,0 +1,39 @@
+import os
+
+from . import UserError, Virtualenv, backed_up_dir, span
+from .lock import locked_path
+from .relocate import clone_tree, find_references
+
+
+def clone_virtualenv(source : Virtualenv, virtualenv : Virtualenv, lock_timeout : float):
+	"""
+	Replace the virtualenv with a copy of the virtualenv at source, in which the text files and symlinks which refer to the path of source are rewritten to refer to the path of the copy.
+	
+	Files are copied using reflinks, if the file system supports them. They are never hardlinked, so that modifying a file of one virtualenv in place, e.g. while trying out an upgrade, does not modify the other one. Both virtualenvs are locked while the copy is made and an existing virtualenv is restored if copying fails.
+	"""
+	
+	origin = os.path.abspath(source.path)
+	target = os.path.abspath(virtualenv.path)
+	
+	if target == origin or target.startswith(os.path.join(origin, '')) or origin.startswith(os.path.join(target, '')):
+		raise UserError('Cannot clone {} to {}, as one contains the other.', source.path, virtualenv.path)
+	
+	# Wait for other processes which are creating either virtualenv. The locks are taken in a fixed order, so that cloning A to B and B to A at the same time cannot deadlock.
+	first_path, second_path = sorted([source.path, virtualenv.path], key = os.path.realpath)
+	
+	with locked_path(first_path, lock_timeout), locked_path(second_path, lock_timeout):
+		if not source.path_exists:
+			raise UserError('{} does not exist.', source.path)
+		elif not source.is_virtualenv:
+			raise UserError('{} is not a virtualenv.', source.path)
+		elif virtualenv.path_exists and not virtualenv.is_virtualenv:
+			raise UserError('{} is not a virtualenv.', virtualenv.path)
+		
+		with span('clone'), backed_up_dir(virtualenv.path):
+			with span('find_references'):
+				references = find_references(source.path, [origin])
+			
+			clone_tree(source.path, virtualenv.path, [(origin, target)], references)
+			
+			# The copy of the stamp still records when the source has last been used.
+			virtualenv.mark_used()
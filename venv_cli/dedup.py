@@ -0,0 +1,207 @@
+import os, stat, shutil, hashlib, concurrent.futures
+
+from . import UserError, log
+from .cache import cache_dir, format_size
+from .lock import locked_path_if_free
+from .relocate import mutable_suffixes, reflink
+from .scan import find_virtualenvs
+
+
+# Suffix of the temporary links which replace files in a virtualenv.
+_temp_suffix = '~venv_cli_dedup'
+
+
+def store_dir():
+	"""
+	Return the path of the content-addressed store of files shared between virtualenvs. Files can only be shared with virtualenvs on the same file system.
+	"""
+	
+	return cache_dir('store')
+
+
+def _hash_file(path):
+	digest = hashlib.sha256()
+	
+	with open(path, 'rb') as file:
+		for i in iter(lambda: file.read(1 << 20), b''):
+			digest.update(i)
+	
+	return digest.hexdigest()
+
+
+def _entry_path(path, st):
+	"""
+	Return the path of the store entry for the file at the specified path. Hardlinked files also share their mode, so executable files are stored separately.
+	
+	Their modification time is not part of the key, even though it is also shared, so the compiled bytecode of a Python source which is replaced by an entry created from a different file is compiled again once.
+	"""
+	
+	name = _hash_file(path)
+	
+	if st.st_mode & 0o111:
+		name += '-x'
+	
+	return os.path.join(store_dir(), name[:2], name[2:])
+
+
+def _store_inodes():
+	inodes = set()
+	
+	for dirpath, dirnames, filenames in os.walk(store_dir()):
+		for i in filenames:
+			st = os.lstat(os.path.join(dirpath, i))
+			inodes.add((st.st_dev, st.st_ino))
+	
+	return inodes
+
+
+def _share_file(path, store_inodes : set, reflink_sources : dict):
+	"""
+	Replace the regular file at the specified path with a link to the store entry with the same content, adding the file to the store if there is no such entry yet. Returns the number of bytes freed.
+	
+	Files which are known to be modified in place are only shared using reflinks, which are copied on write. As whether a reflinked copy is still used cannot be determined from the store, these are not added to the store but reflinked to the first file with the same content seen during the same run, which is recorded in reflink_sources. All other files are shared using hardlinks, which also share the page cache, and are made read-only, so that modifying one in place fails instead of modifying it in all virtualenvs. Tools which replace files, like pip, are not affected by this.
+	"""
+	
+	st = os.lstat(path)
+	
+	if (st.st_dev, st.st_ino) in store_inodes:
+		return 0
+	
+	entry_path = _entry_path(path, st)
+	temp_path = path + _temp_suffix
+	
+	if os.path.lexists(temp_path):
+		os.unlink(temp_path)
+	
+	if os.path.basename(path).endswith(mutable_suffixes):
+		source = reflink_sources.setdefault(entry_path, path)
+		
+		if source != path and reflink(source, temp_path):
+			shutil.copystat(path, temp_path)
+			os.replace(temp_path, path)
+		
+		# Whether the file already shared its data with the source cannot be determined, so nothing is counted.
+		return 0
+	
+	os.makedirs(os.path.dirname(entry_path), exist_ok = True)
+	
+	try:
+		os.link(path, entry_path)
+	except FileExistsError:
+		pass
+	else:
+		os.chmod(entry_path, stat.S_IMODE(st.st_mode) & ~0o222)
+		store_inodes.add((st.st_dev, st.st_ino))
+		
+		return 0
+	
+	try:
+		os.link(entry_path, temp_path)
+	except FileNotFoundError:
+		# The entry has been removed by another process in the meantime.
+		return 0
+	
+	os.replace(temp_path, path)
+	
+	# The data is only freed if no other path refers to it.
+	return st.st_size if st.st_nlink == 1 else 0
+
+
+def _virtualenv_files(path):
+	for dirpath, dirnames, filenames in os.walk(path):
+		for i in filenames:
+			file_path = os.path.join(dirpath, i)
+			st = os.lstat(file_path)
+			
+			# Empty files do not take up any space, but e.g. the last used stamp is written to.
+			if stat.S_ISREG(st.st_mode) and st.st_size and not i.endswith(_temp_suffix):
+				yield file_path
+
+
+def _share_virtualenv(path, store_inodes : set, reflink_sources : dict, executor):
+	"""
+	Share the files of the virtualenv at the specified path using the store. Returns the number of bytes freed.
+	"""
+	
+	if os.stat(path).st_dev != os.stat(store_dir()).st_dev:
+		log('Skipping {}, which is on a different file system than the store {}.', path, store_dir())
+		
+		return 0
+	
+	def share(file_path):
+		try:
+			return _share_file(file_path, store_inodes, reflink_sources)
+		except OSError as e:
+			log('Sharing {} failed: {}', file_path, e)
+			
+			return 0
+	
+	return sum(executor.map(share, list(_virtualenv_files(path))))
+
+
+def _prune_store():
+	"""
+	Remove the store entries which are no longer used by any virtualenv. Returns the number of bytes freed.
+	"""
+	
+	size = 0
+	
+	for dirpath, dirnames, filenames in os.walk(store_dir()):
+		for i in filenames:
+			path = os.path.join(dirpath, i)
+			st = os.lstat(path)
+			
+			if st.st_nlink == 1:
+				os.unlink(path)
+				size += st.st_size
+	
+	return size
+
+
+def share_virtualenv(path, jobs : int = None):
+	"""
+	Share the files of a newly created virtualenv with other virtualenvs using the store, as --dedup does.
+	"""
+	
+	os.makedirs(store_dir(), exist_ok = True)
+	
+	with concurrent.futures.ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+		freed = _share_virtualenv(path, _store_inodes(), { }, executor)
+	
+	log('Shared the files of {} with other virtualenvs, freeing {}.', path, format_size(freed))
+
+
+def dedup_tree(root, jobs : int = None):
+	"""
+	Replace identical files in the virtualenvs below root with links to a single copy in the store and report the space freed. Files which are already linked to the store are not read again. Virtualenvs which are currently being created by another invocation are skipped.
+	
+	Afterwards, store entries which are no longer used by any virtualenv are removed.
+	"""
+	
+	if not os.path.isdir(root):
+		raise UserError('{} is not a directory.', root)
+	
+	os.makedirs(store_dir(), exist_ok = True)
+	
+	store_inodes = _store_inodes()
+	reflink_sources = { }
+	count = 0
+	freed = 0
+	
+	with concurrent.futures.ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+		for i in find_virtualenvs(root):
+			with locked_path_if_free(i) as acquired:
+				if not acquired:
+					log('Skipping {}, which is in use by another process.', i)
+					
+					continue
+				
+				size = _share_virtualenv(i, store_inodes, reflink_sources, executor)
+			
+			log('Deduplicated {}, freeing {}.', i, format_size(size))
+			count += 1
+			freed += size
+	
+	freed += _prune_store()
+	
+	log('Deduplicated {} virtualenvs, freeing {} in total.', count, format_size(freed))
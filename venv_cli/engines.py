@@ -0,0 +1,60 @@
+import shutil
+
+from . import UserError, command
+
+
+class VirtualenvEngine:
+	"""
+	Creates virtualenvs by running the virtualenv command.
+	"""
+	
+	name = 'virtualenv'
+	
+	def version(self):
+		"""
+		Return a string identifying the version of the engine or None, if it is not available.
+		"""
+		
+		from .templates import virtualenv_version
+		
+		executable = shutil.which('virtualenv')
+		
+		if executable is None:
+			return None
+		
+		return virtualenv_version(executable).split(' from ')[0]
+	
+	def create(self, path, python : str, prompt : str):
+		command('virtualenv', '--python', python, '--prompt', prompt, path, prefix = path)
+
+
+class StdlibEngine:
+	"""
+	Creates virtualenvs using the venv module of the standard library. This happens within the current process, if the interpreter is the one running this program, so that no additional interpreter needs to be started. Otherwise, the venv module is run by the specified interpreter.
+	"""
+	
+	name = 'stdlib'
+	
+	def version(self):
+		# The version of the venv module is determined by the version of the interpreter.
+		return 'venv'
+	
+	def create(self, path, python : str, prompt : str):
+		from .templates import interpreter_info, is_running_interpreter
+		
+		info = interpreter_info(python)
+		
+		if info is None:
+			raise UserError('Interpreter {} cannot be run.', python)
+		
+		executable, version = info
+		
+		if is_running_interpreter(info):
+			import venv
+			
+			venv.EnvBuilder(with_pip = True, prompt = prompt).create(path)
+		else:
+			command(executable, '-m', 'venv', '--prompt', prompt, path, prefix = path)
+
+
+engines = { i.name: i for i in [VirtualenvEngine(), StdlibEngine()] }
@@ -0,0 +1,127 @@
+import os, re, glob, json
+
+from . import UserError, command, which
+from .cache import memoize_for_files
+
+
+# Names of executables which are considered interpreters, e.g. `python3.9' or `pypy3'.
+_name_pattern = re.compile(r'(python|pypy)(\d+(\.\d+)?)?$')
+
+# Values of --python which are looked up in the registry, unless they name an executable, e.g. `3.9' or `pypy3.10'.
+_spec_pattern = re.compile(r'(python|cpython|pypy)?(\d+(\.\d+)*)$')
+
+# Also works with Python 2.
+_info_script = 'import json, platform, struct; print(json.dumps([platform.python_implementation(), platform.python_version(), "{}-{}bit".format(platform.machine(), struct.calcsize("P") * 8)]))'
+
+
+def _version_tuple(version : str):
+	return tuple(int(i) for i in re.match(r'\d+(\.\d+)*', version).group().split('.'))
+
+
+class Interpreter:
+	def __init__(self, path, implementation, version, architecture):
+		self.path = path
+		self.implementation = implementation
+		self.version = version
+		self.architecture = architecture
+	
+	@property
+	def version_tuple(self):
+		return _version_tuple(self.version)
+
+
+def _search_dirs():
+	"""
+	Return the directories which are searched for interpreters, in order of preference. These are the directories on the PATH and the directories where interpreters are commonly installed.
+	"""
+	
+	dirs = os.get_exec_path() + sorted(glob.glob(os.path.expanduser('~/.pyenv/versions/*/bin')), reverse = True) + ['/usr/local/bin', '/usr/bin'] + sorted(glob.glob('/opt/python*/bin'), reverse = True)
+	
+	return [i for i in dirs if os.path.isdir(i)]
+
+
+def _is_script(path):
+	# Wrapper scripts like pyenv's shims may run a different interpreter each time and thus cannot be cached.
+	with open(path, 'rb') as file:
+		return file.read(2) == b'#!'
+
+
+def _candidates():
+	"""
+	Return the paths of the executables in the search directories whose names look like those of interpreters. Executables which refer to the same file are only listed once.
+	"""
+	
+	candidates = []
+	seen = set()
+	
+	for i in _search_dirs():
+		try:
+			names = sorted(os.listdir(i))
+		except OSError:
+			continue
+		
+		for j in names:
+			path = os.path.join(i, j)
+			
+			if not _name_pattern.match(j) or not os.path.isfile(path) or not os.access(path, os.X_OK):
+				continue
+			
+			real_path = os.path.realpath(path)
+			
+			if real_path not in seen and not _is_script(path):
+				seen.add(real_path)
+				candidates.append(path)
+	
+	return candidates
+
+
+def _interpreter_info(path):
+	try:
+		result = command(path, '-E', '-c', _info_script, use_stdout = True, use_stderr = True)
+	except Exception:
+		return None
+	
+	return json.loads(result.stdout.decode())
+
+
+def find_interpreters():
+	"""
+	Return a list of the interpreters found in the search directories, in order of preference. The information about each interpreter is cached for as long as its executable does not change, so that interpreters only need to be started the first time they are found.
+	"""
+	
+	candidates = _candidates()
+	infos = memoize_for_files(candidates, 'interpreter_info', _interpreter_info)
+	
+	return [Interpreter(i, *j) for i, j in zip(candidates, infos) if j is not None]
+
+
+def resolve_python(spec : str):
+	"""
+	Return the interpreter to use for the specified value of --python. Names and paths of executables are used as they are. Otherwise, the value is matched against the implementations and version prefixes of the interpreters in the registry, e.g. `3.9' or `pypy3', and the matching interpreter with the highest version is used.
+	
+	Raises a UserError, if no interpreter matches.
+	"""
+	
+	if os.sep in spec:
+		if os.path.isfile(spec) and os.access(spec, os.X_OK):
+			return spec
+	elif which(spec) is not None:
+		return spec
+	else:
+		match = _spec_pattern.match(spec)
+		
+		if match:
+			implementation = 'PyPy' if match.group(1) == 'pypy' else 'CPython'
+			version = _version_tuple(match.group(2))
+			interpreters = [i for i in find_interpreters() if i.implementation == implementation and i.version_tuple[:len(version)] == version]
+			
+			if interpreters:
+				# The first of the highest versions, so that the order of the search directories is respected.
+				return max(interpreters, key = lambda x: x.version_tuple).path
+	
+	raise UserError('No interpreter found for {}. Run `venv --list-pythons\' to list the available interpreters.', spec)
+
+
+def print_interpreters():
+	for i in find_interpreters():
+		print('{:<8} {:<10} {:<14} {}'.format(i.implementation, i.version, i.architecture, i.path))
@@ -0,0 +1,112 @@
+import os, stat, shutil
+
+from . import span
+from .cache import DirectoryCache, cache_dir, parse_size
+from .relocate import clone_tree, copy_file, find_references
+from .wheelhouse import install_dependencies, project_requirements
+
+
+def layer_cache():
+	return DirectoryCache(cache_dir('layers'), parse_size(os.environ.get('VENV_CLI_LAYER_CACHE_SIZE', '1G')))
+
+
+def _tree_state(root):
+	"""
+	Return a dict which maps the relative paths of the directories, files and symlinks below root to a value which changes when the entry is replaced or modified.
+	"""
+	
+	state = { }
+	
+	for dirpath, dirnames, filenames in os.walk(root):
+		for i in dirnames + filenames:
+			path = os.path.join(dirpath, i)
+			st = os.lstat(path)
+			
+			if stat.S_ISDIR(st.st_mode):
+				state[os.path.relpath(path, root)] = None
+			else:
+				state[os.path.relpath(path, root)] = [st.st_ino, st.st_size, st.st_mtime_ns]
+	
+	return state
+
+
+def _build_layer(path, virtualenv_path, base_state : dict, description):
+	"""
+	Copy the entries of the virtualenv which have been added or modified since base_state was recorded to a new layer at path/layer. The entries which have been removed are recorded in the metadata.
+	"""
+	
+	layer_path = os.path.join(path, 'layer')
+	state = _tree_state(virtualenv_path)
+	
+	os.mkdir(layer_path)
+	
+	# Parents are sorted before their children.
+	for i in sorted(state):
+		if i in base_state and base_state[i] == state[i]:
+			continue
+		
+		source_path = os.path.join(virtualenv_path, i)
+		target_path = os.path.join(layer_path, i)
+		
+		os.makedirs(os.path.dirname(target_path), exist_ok = True)
+		
+		if os.path.islink(source_path):
+			os.symlink(os.readlink(source_path), target_path)
+		elif state[i] is None:
+			os.makedirs(target_path, exist_ok = True)
+		else:
+			copy_file(source_path, target_path)
+	
+	# Only the topmost removed entries need to be removed again.
+	removed = sorted(i for i in base_state if i not in state and os.path.dirname(i) in state.keys() | { '' })
+	origin = os.path.abspath(virtualenv_path)
+	
+	return dict(
+		origin = origin,
+		references = find_references(layer_path, [origin]),
+		removed = removed,
+		description = description)
+
+
+def _apply_layer(entry, virtualenv_path):
+	for i in entry.metadata['removed']:
+		path = os.path.join(virtualenv_path, i)
+		
+		if os.path.isdir(path) and not os.path.islink(path):
+			shutil.rmtree(path)
+		elif os.path.lexists(path):
+			os.unlink(path)
+	
+	replacements = [(entry.metadata['origin'], os.path.abspath(virtualenv_path))]
+	
+	clone_tree(os.path.join(entry.path, 'layer'), virtualenv_path, replacements, entry.metadata['references'], allow_hardlinks = True, merge = True)
+
+
+def install_dependencies_from_layer(virtualenv, find_links : list = [], jobs : int = None):
+	"""
+	Install the requirements of the project in the current directory into a newly created virtualenv, like install_dependencies(), but using a cached snapshot of the changes made by installing them.
+	
+	The snapshot is keyed by the interpreter, the requirements and the entries of the virtualenv before they are installed. If there is no such snapshot, the requirements are installed and a snapshot is stored. Otherwise, the snapshot is cloned into the virtualenv, using reflinks or, if the file system does not support them, read-only hardlinks, so that the snapshot cannot be modified through the virtualenv.
+	"""
+	
+	requirements = project_requirements(virtualenv)
+	
+	if not requirements:
+		return
+	
+	version = virtualenv.python_version_string
+	base_state = _tree_state(virtualenv.path)
+	cache = layer_cache()
+	key = cache.key_for(os.path.realpath(virtualenv.python_path), version, requirements, [os.path.abspath(i) for i in find_links], sorted(base_state))
+	entry = cache.lookup(key)
+	
+	if entry is None:
+		install_dependencies(virtualenv, find_links, jobs, requirements)
+		
+		description = 'dependencies for {}: {}'.format(version, ', '.join(requirements))
+		
+		with span('store_layer'):
+			cache.store(key, lambda x: _build_layer(x, virtualenv.path, base_state, description))
+	else:
+		with span('apply_layer'):
+			_apply_layer(entry, virtualenv.path)
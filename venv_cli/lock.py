@@ -0,0 +1,94 @@
+import os, time, fcntl, hashlib, contextlib
+
+from . import UserError, log
+from .cache import cache_dir
+
+
+def lock_path(path):
+	"""
+	Return the path of the lock file for the specified path. This is a file in the cache directory named by a hash of the absolute path, so that no files are left next to the virtualenvs. It is never removed, as that would allow two processes to lock different files.
+	"""
+	
+	return cache_dir('locks', hashlib.sha256(os.fsencode(os.path.abspath(path))).hexdigest()[:32])
+
+
+def _open_lock_file(path):
+	file_path = lock_path(path)
+	
+	try:
+		try:
+			return os.open(file_path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o666)
+		except FileNotFoundError:
+			os.makedirs(os.path.dirname(file_path), exist_ok = True)
+			
+			return os.open(file_path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o666)
+	except OSError as e:
+		raise UserError('Creating the lock file for {} failed: {}', path, e)
+
+
+@contextlib.contextmanager
+def locked_path(path, timeout : float):
+	"""
+	Hold an exclusive advisory lock on the specified path while the context is active. If another process holds the lock, this waits for up to timeout seconds until it is released and raises a UserError otherwise.
+	
+	Yields whether another process held the lock at first.
+	"""
+	
+	fd = _open_lock_file(path)
+	
+	try:
+		try:
+			fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+			waited = False
+		except BlockingIOError:
+			log('Waiting for another process to finish creating {}.', path)
+			
+			_wait_for_lock(fd, path, timeout)
+			waited = True
+		
+		yield waited
+	finally:
+		# This also releases the lock.
+		os.close(fd)
+
+
+@contextlib.contextmanager
+def locked_path_if_free(path):
+	"""
+	Like locked_path() but does not wait if another process holds the lock. Yields whether the lock has been acquired.
+	"""
+	
+	fd = _open_lock_file(path)
+	
+	try:
+		try:
+			fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+			acquired = True
+		except BlockingIOError:
+			acquired = False
+		
+		yield acquired
+	finally:
+		os.close(fd)
+
+
+def _wait_for_lock(fd, path, timeout):
+	# flock() cannot time out, so the lock is polled with an increasing interval.
+	deadline = time.monotonic() + timeout
+	interval = 0.01
+	
+	while True:
+		try:
+			fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+			
+			return
+		except BlockingIOError:
+			pass
+		
+		remaining = deadline - time.monotonic()
+		
+		if remaining <= 0:
+			raise UserError('Timed out after {:g} s waiting for another process to finish creating {}.', timeout, path)
+		
+		time.sleep(min(interval, remaining))
+		interval = min(interval * 2, 0.5)
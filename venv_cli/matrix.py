@@ -0,0 +1,79 @@
+import os, time, concurrent.futures
+
+from . import UserError, Virtualenv, log
+
+
+def _target_path(path, python):
+	return '{}-{}'.format(path, os.path.basename(python))
+
+
+def matrix_targets(pythons : list, path):
+	"""
+	Return a list of pairs of interpreter and virtualenv, one for each of the specified interpreters.
+	"""
+	
+	return [(i, Virtualenv(_target_path(path, i))) for i in pythons]
+
+
+def read_matrix_file(file_path, path):
+	"""
+	Read a list of pairs of interpreter and virtualenv from the specified file. Each non-empty line which does not start with `#' contains the name of an interpreter and optionally the path of the virtualenv. Relative paths are relative to the current directory.
+	"""
+	
+	targets = []
+	
+	try:
+		with open(file_path, 'r', encoding = 'utf-8') as file:
+			lines = file.read().splitlines()
+	except OSError as e:
+		raise UserError('Reading {} failed: {}', file_path, e)
+	
+	for i, line in enumerate(lines):
+		parts = line.split('#', 1)[0].split()
+		
+		if not parts:
+			continue
+		elif len(parts) == 1:
+			parts.append(_target_path(path, parts[0]))
+		elif len(parts) > 2:
+			raise UserError('{}:{}: Expected an interpreter and an optional path.', file_path, i + 1)
+		
+		targets.append((parts[0], Virtualenv(parts[1])))
+	
+	if not targets:
+		raise UserError('{} does not list any virtualenvs.', file_path)
+	
+	return targets
+
+
+def create_matrix(targets : list, create, jobs : int = None):
+	"""
+	Call create(python, virtualenv) for each of the specified pairs of interpreter and virtualenv in parallel and report the result of each call.
+	
+	Each failure is reported but does not stop the creation of the other virtualenvs. A UserError is raised at the end if any of them failed.
+	"""
+	
+	def create_target(python, virtualenv):
+		start = time.perf_counter()
+		create(python, virtualenv)
+		
+		return time.perf_counter() - start
+	
+	failed = 0
+	
+	with concurrent.futures.ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+		futures = { executor.submit(create_target, *i): i for i in targets }
+		
+		for future in concurrent.futures.as_completed(futures):
+			python, virtualenv = futures[future]
+			
+			try:
+				duration = future.result()
+			except Exception as e:
+				failed += 1
+				log('Creating {} with {} failed: {}', virtualenv.path, python, e)
+			else:
+				log('Created {} with {} in {:.1f} s.', virtualenv.path, python, duration)
+	
+	if failed:
+		raise UserError('{} of {} virtualenvs could not be created.', failed, len(targets))
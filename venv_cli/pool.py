@@ -0,0 +1,335 @@
+import os, sys, json, math, time, uuid, socket, signal, threading, collections
+
+from . import UserError, Virtualenv, finish_timings, log, rm_temp, which
+from .cache import cache_dir, file_identity
+from .templates import prompt_placeholder
+
+
+# Number of seconds over which the demand for spare virtualenvs is measured.
+_demand_window = 600
+
+# Number of seconds a client waits for the daemon before falling back to creating the virtualenv itself.
+_client_timeout = 2
+
+
+def pool_socket_path():
+	return cache_dir('pool.sock')
+
+
+def pool_dir():
+	"""
+	Return the directory which holds the spare virtualenvs. They are moved into place with a rename, so they can only be claimed for paths on the same file system.
+	"""
+	
+	return cache_dir('pool')
+
+
+def _executable(python : str):
+	"""
+	Return the path of the interpreter with the specified name or path or None, if it cannot be found. Clients and the daemon use this to agree on the interpreter without starting it.
+	"""
+	
+	if os.sep in python:
+		return os.path.abspath(python)
+	
+	return which(python)
+
+
+class _Spare:
+	def __init__(self, path, references : list, identity):
+		self.path = path
+		self.references = references
+		
+		# Identity of the interpreter when the spare was created, so that spares for an upgraded interpreter are not handed out.
+		self.identity = identity
+
+
+class _Pool:
+	"""
+	The spare virtualenvs for one interpreter and engine. The number of spares adapts to the demand: Enough spares are kept to serve the requests which are expected to arrive while the spares are refilled, at least one and at most max_size.
+	"""
+	
+	def __init__(self, executable, engine : str, max_size : int):
+		self.executable = executable
+		self.engine = engine
+		self.max_size = max_size
+		self.spares = collections.deque()
+		self.requests = collections.deque()
+		
+		# Moving average of the number of seconds it takes to create a spare.
+		self.duration = None
+	
+	def record_request(self):
+		self.requests.append(time.monotonic())
+	
+	def record_duration(self, duration : float):
+		self.duration = duration if self.duration is None else 0.8 * self.duration + 0.2 * duration
+	
+	@property
+	def target_size(self):
+		now = time.monotonic()
+		
+		while self.requests and self.requests[0] < now - _demand_window:
+			self.requests.popleft()
+		
+		rate = len(self.requests) / _demand_window
+		
+		# Twice the number of requests expected while one spare is being created.
+		return min(self.max_size, 1 + math.ceil(2 * rate * (self.duration or 0)))
+
+
+class PoolDaemon:
+	"""
+	Keeps pools of spare virtualenvs per interpreter and engine and hands them out to clients over a unix socket. The pools are refilled by a background thread.
+	"""
+	
+	def __init__(self, pythons : list, engine : str, max_size : int):
+		self.engine = engine
+		self.max_size = max_size
+		self.pools = { }
+		self.condition = threading.Condition()
+		
+		for i in pythons:
+			executable = _executable(i)
+			
+			if executable is None:
+				raise UserError('Interpreter {} not found.', i)
+			
+			self._pool(executable, engine)
+	
+	def _pool(self, executable, engine : str):
+		key = executable, engine
+		
+		if key not in self.pools:
+			self.pools[key] = _Pool(executable, engine, self.max_size)
+		
+		return self.pools[key]
+	
+	def _create_spare(self, pool : _Pool):
+		"""
+		Create a spare virtualenv with the same prompt placeholder as a template, so that the prompt can be replaced when it is claimed.
+		"""
+		
+		from .relocate import find_references
+		
+		path = os.path.join(pool_dir(), uuid.uuid4().hex)
+		start = time.monotonic()
+		identity = file_identity(os.path.realpath(pool.executable))
+		
+		Virtualenv(path).create(pool.executable, prompt_placeholder, False, engine = pool.engine)
+		
+		pool.record_duration(time.monotonic() - start)
+		
+		return _Spare(path, find_references(path, [os.path.abspath(path), prompt_placeholder]), identity)
+	
+	def _next_task(self):
+		"""
+		Return a pool which needs another spare and the list of spares which are no longer needed, waiting until there is something to do.
+		"""
+		
+		with self.condition:
+			while True:
+				surplus = []
+				
+				for i in self.pools.values():
+					target_size = i.target_size
+					
+					while len(i.spares) > target_size:
+						surplus.append(i.spares.popleft())
+					
+					if len(i.spares) < target_size:
+						return i, surplus
+				
+				if surplus:
+					return None, surplus
+				
+				# Wake up regularly to reduce the pools as the demand decays.
+				self.condition.wait(60)
+	
+	def _refill(self):
+		while True:
+			pool, surplus = self._next_task()
+			
+			for i in surplus:
+				rm_temp(i.path)
+			
+			if pool is None:
+				continue
+			
+			try:
+				spare = self._create_spare(pool)
+			except Exception as e:
+				# Stop serving the interpreter until it is requested again, instead of retrying forever.
+				log('Creating a spare virtualenv for {} failed: {}', pool.executable, e)
+				
+				with self.condition:
+					del self.pools[pool.executable, pool.engine]
+				
+				continue
+			
+			with self.condition:
+				pool.spares.append(spare)
+	
+	def _claim(self, executable, engine : str):
+		with self.condition:
+			pool = self._pool(executable, engine)
+			pool.record_request()
+			
+			while pool.spares:
+				spare = pool.spares.popleft()
+				
+				if spare.identity == file_identity(os.path.realpath(executable)):
+					break
+				
+				rm_temp(spare.path)
+			else:
+				spare = None
+			
+			# The refill thread may need to create more spares.
+			self.condition.notify()
+		
+		if spare is None:
+			return { }
+		
+		log('Handed out {}.', spare.path)
+		
+		return dict(path = spare.path, origin = os.path.abspath(spare.path), references = spare.references)
+	
+	def _status(self):
+		with self.condition:
+			return [dict(python = i.executable, engine = i.engine, spares = len(i.spares), target = i.target_size) for i in self.pools.values()]
+	
+	def _handle(self, connection):
+		with connection, connection.makefile('rwb') as file:
+			request = json.loads(file.readline().decode())
+			
+			if request['command'] == 'claim':
+				response = self._claim(request['python'], request['engine'])
+			else:
+				response = self._status()
+			
+			file.write(json.dumps(response).encode() + b'\n')
+	
+	def run(self):
+		from .lock import locked_path_if_free
+		
+		socket_path = pool_socket_path()
+		
+		os.makedirs(os.path.dirname(socket_path), exist_ok = True)
+		
+		with locked_path_if_free(socket_path) as acquired:
+			if not acquired:
+				raise UserError('Another pool daemon is already running.')
+			
+			# Spares left behind by a previous daemon may be incomplete.
+			rm_temp(pool_dir())
+			os.makedirs(pool_dir())
+			
+			if os.path.lexists(socket_path):
+				os.unlink(socket_path)
+			
+			# Terminate cleanly, so that the socket and the spares are removed.
+			signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+			
+			server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			
+			try:
+				server.bind(socket_path)
+				server.listen()
+				
+				threading.Thread(target = self._refill, daemon = True).start()
+				log('Serving spare virtualenvs on {}.', socket_path)
+				
+				while True:
+					connection, _ = server.accept()
+					connection.settimeout(_client_timeout)
+					
+					try:
+						self._handle(connection)
+					except (OSError, ValueError, KeyError) as e:
+						log('Handling a request failed: {}', e)
+			except OSError as e:
+				raise UserError('Serving on {} failed: {}', socket_path, e)
+			finally:
+				server.close()
+				
+				if os.path.lexists(socket_path):
+					os.unlink(socket_path)
+				
+				rm_temp(pool_dir())
+
+
+def _request(request : dict):
+	"""
+	Send a request to the daemon and return its response. Raises OSError, if no daemon is running.
+	"""
+	
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+		client.settimeout(_client_timeout)
+		client.connect(pool_socket_path())
+		
+		with client.makefile('rwb') as file:
+			file.write(json.dumps(request).encode() + b'\n')
+			file.flush()
+			
+			return json.loads(file.readline().decode())
+
+
+def claim_spare(path, python : str, prompt : str, engine : str):
+	"""
+	Create a virtualenv at the specified path by claiming a spare virtualenv from the pool daemon, moving it into place and rewriting the references to its previous path and prompt.
+	
+	Returns False without doing anything, if no daemon is running, it has no spare for the interpreter and engine or the path is on a different file system than the pool.
+	"""
+	
+	from .relocate import rewrite_references
+	
+	executable = _executable(python)
+	
+	if executable is None or not os.path.exists(pool_socket_path()):
+		return False
+	
+	try:
+		# Otherwise the spare could not be renamed into place.
+		if os.stat(pool_dir()).st_dev != os.stat(os.path.dirname(os.path.abspath(path))).st_dev:
+			return False
+	except OSError:
+		return False
+	
+	try:
+		response = _request(dict(command = 'claim', python = executable, engine = engine))
+	except (OSError, ValueError):
+		return False
+	
+	if not response:
+		return False
+	
+	try:
+		os.rename(response['path'], path)
+	except OSError:
+		# The spare has been handed out to this process and would never be removed otherwise.
+		rm_temp(response['path'])
+		
+		return False
+	
+	rewrite_references(path, response['references'], [(response['origin'], os.path.abspath(path)), (prompt_placeholder, prompt)])
+	
+	return True
+
+
+def print_pool_status():
+	try:
+		pools = _request(dict(command = 'status'))
+	except (OSError, ValueError):
+		raise UserError('No pool daemon is running.')
+	
+	for i in pools:
+		print('{:<10} {:>3}/{:<3} {}'.format(i['engine'], i['spares'], i['target'], i['python']))
+
+
+def run_pool_daemon(pythons : list, engine : str, max_size : int):
+	daemon = PoolDaemon(pythons, engine, max_size)
+	
+	# The daemon runs until it is terminated, so only its startup is recorded.
+	finish_timings(0)
+	daemon.run()
@@ -0,0 +1,221 @@
+import os, errno, mmap, shutil, stat, shlex
+
+
+# From <linux/fs.h>.
+_FICLONE = 0x40049409
+
+# Files which may be modified in place by tools running in the virtualenv and thus must never be shared using a hardlink.
+mutable_suffixes = ('.pth', '.egg-link', 'pyvenv.cfg')
+
+# Files of at least this size are scanned through a memory map instead of being read. Mapping small files is slower than reading them.
+_mmap_threshold = 1 << 16
+
+
+def reflink(source, target):
+	"""
+	Create target as a copy-on-write clone of source. Returns False, if the filesystem does not support this.
+	"""
+	
+	try:
+		import fcntl
+	except ImportError:
+		return False
+	
+	with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+		try:
+			fcntl.ioctl(target_file.fileno(), _FICLONE, source_file.fileno())
+		except OSError as e:
+			if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+				target_file.close()
+				os.unlink(target)
+				
+				return False
+			
+			raise
+	
+	return True
+
+
+def copy_file(source, target, *, allow_hardlink = False):
+	"""
+	Copy a regular file using a reflink, a hardlink or, if neither is possible, by copying the data.
+	
+	A hardlinked file is made read-only, so that modifying it in place fails instead of also modifying source and every other copy of it. Tools which replace files, like pip, are not affected by this.
+	"""
+	
+	if reflink(source, target):
+		shutil.copystat(source, target)
+	else:
+		if allow_hardlink:
+			try:
+				os.link(source, target)
+			except OSError:
+				pass
+			else:
+				os.chmod(target, stat.S_IMODE(os.stat(target).st_mode) & ~0o222)
+				
+				return
+		
+		shutil.copy2(source, target)
+
+
+def _is_text_containing(data, needles):
+	# Binary files (e.g. compiled bytecode) cannot be rewritten if the length of the replaced path changes.
+	return data.find(b'\0') == -1 and any(data.find(i) != -1 for i in needles)
+
+
+def _is_rewritable(path, needles):
+	with open(path, 'rb') as file:
+		if os.fstat(file.fileno()).st_size < _mmap_threshold:
+			return _is_text_containing(file.read(), needles)
+		
+		# Only the pages up to the first null byte are read from large binary files, like shared libraries.
+		with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+			return _is_text_containing(data, needles)
+
+
+def find_references(root, needles : list):
+	"""
+	Return the paths, relative to root, of all text files and symlinks below root which contain any of the specified strings.
+	
+	A virtualenv contains its own absolute path in a few text files (activate scripts, shebangs of console scripts, pyvenv.cfg). These need to be rewritten when it is copied to a different path.
+	"""
+	
+	needles = [i.encode() for i in needles]
+	references = []
+	
+	for dirpath, dirnames, filenames in os.walk(root):
+		for i in dirnames + filenames:
+			path = os.path.join(dirpath, i)
+			
+			if os.path.islink(path):
+				found = any(j in os.fsencode(os.readlink(path)) for j in needles)
+			elif i in filenames and os.path.isfile(path):
+				found = _is_rewritable(path, needles)
+			else:
+				found = False
+			
+			if found:
+				references.append(os.path.relpath(path, root))
+	
+	return sorted(references)
+
+
+def _quote_for(relative_path):
+	"""
+	Return a function which quotes a string for use in the specified file.
+	"""
+	
+	if relative_path == os.path.join('bin', 'activate'):
+		return shlex.quote
+	else:
+		return lambda x: x
+
+
+def _fix_shebang(data : bytes):
+	"""
+	Replace a shebang line which cannot be handled by the kernel because it contains whitespace or is too long with the same trampoline that distlib uses in these cases.
+	"""
+	
+	first_line, newline, rest = data.partition(b'\n')
+	interpreter = first_line[2:]
+	
+	if not first_line.startswith(b'#!/') or not (b' ' in interpreter or len(first_line) > 127):
+		return data
+	
+	return b'#!/bin/sh\n\'\'\'exec\' "' + interpreter + b'" "$0" "$@"\n\' \'\'\'' + newline + rest
+
+
+def rewrite_file(source, target, replacements : list, quote = lambda x: x):
+	"""
+	Write the content of source to target, applying the specified list of replacements, which are pairs of strings. The file mode of source is preserved.
+	
+	quote is applied to both strings of a replacement, which allows replacing strings which had to be quoted when they were written to the file. If the quoted string does not occur in the file, e.g. because it has been written into a double-quoted string, the strings are replaced without quoting.
+	"""
+	
+	with open(source, 'rb') as file:
+		data = file.read()
+	
+	for old, new in replacements:
+		if quote(old).encode() in data:
+			old, new = quote(old), quote(new)
+		
+		data = data.replace(old.encode(), new.encode())
+	
+	with open(target, 'wb') as file:
+		file.write(_fix_shebang(data))
+	
+	shutil.copymode(source, target)
+
+
+def clone_tree(source, target, replacements : list, references : list, *, allow_hardlinks = False, merge = False):
+	"""
+	Copy the directory tree at source to target, which must not exist, unless merge is set. In that case, the tree is copied into the existing directory, replacing files which already exist.
+	
+	The files and symlinks in references (as returned by find_references()) are rewritten by applying the specified replacements. If allow_hardlinks is set, other files may be hardlinked to the files in source when reflinks are not supported, unless they are known to be modified in place. Hardlinked files are made read-only, as with copy_file().
+	"""
+	
+	references = set(references)
+	
+	for dirpath, dirnames, filenames in os.walk(source):
+		relative_dir = os.path.relpath(dirpath, source)
+		target_dir = os.path.normpath(os.path.join(target, relative_dir))
+		
+		if not merge or not os.path.isdir(target_dir):
+			os.mkdir(target_dir)
+			shutil.copymode(dirpath, target_dir)
+		
+		for i in dirnames + filenames:
+			relative_path = os.path.normpath(os.path.join(relative_dir, i))
+			source_path = os.path.join(dirpath, i)
+			target_path = os.path.join(target_dir, i)
+			
+			# Unlink instead of overwriting an existing file, in case it is a hardlink.
+			if merge and (i in filenames or os.path.islink(source_path)) and os.path.lexists(target_path):
+				os.unlink(target_path)
+			
+			if os.path.islink(source_path):
+				link = os.readlink(source_path)
+				
+				if relative_path in references:
+					for old, new in replacements:
+						link = link.replace(old, new)
+				
+				os.symlink(link, target_path)
+			elif i in filenames:
+				if relative_path in references:
+					rewrite_file(source_path, target_path, replacements, _quote_for(relative_path))
+				elif stat.S_ISREG(os.lstat(source_path).st_mode):
+					copy_file(source_path, target_path, allow_hardlink = allow_hardlinks and not i.endswith(mutable_suffixes))
+
+
+def relocate_tree(root, old_path, new_path):
+	"""
+	Rewrite all references to old_path in the text files and symlinks below root, in place.
+	"""
+	
+	rewrite_references(root, find_references(root, [old_path]), [(old_path, new_path)])
+
+
+def rewrite_references(root, references : list, replacements : list):
+	"""
+	Apply the specified replacements to the files and symlinks in references (as returned by find_references()) below root, in place.
+	"""
+	
+	for i in references:
+		path = os.path.join(root, i)
+		
+		if os.path.islink(path):
+			link = os.readlink(path)
+			
+			for old, new in replacements:
+				link = link.replace(old, new)
+			
+			os.unlink(path)
+			os.symlink(link, path)
+		else:
+			# Replace the file instead of writing to it, in case it is a hardlink.
+			temp_path = path + '~venv_cli_relocate'
+			
+			rewrite_file(path, temp_path, replacements, _quote_for(i))
+			os.replace(temp_path, path)
@@ -0,0 +1,112 @@
+import os, sys, json, concurrent.futures
+
+from . import UserError, Virtualenv
+from .cache import cache_dir, tree_size
+
+
+def looks_like_virtualenv(path):
+	"""
+	Return whether there is a virtualenv at the specified path. Unlike Virtualenv.is_virtualenv, this is also true, if its interpreter has been removed.
+	"""
+	
+	return os.path.isfile(os.path.join(path, 'pyvenv.cfg')) or Virtualenv(path).is_virtualenv
+
+
+def find_virtualenvs(root, is_match = looks_like_virtualenv):
+	"""
+	Yield the paths of the virtualenvs below root, as soon as they are found. Directories within virtualenvs and symlinks to directories are not searched.
+	
+	A different function which decides whether a directory is yielded instead of searched can be specified as is_match.
+	
+	The cache directory of this program is not searched. The templates, dependency layers and spare virtualenvs in it would otherwise be mistaken for virtualenvs of the user.
+	"""
+	
+	cache_path = os.path.realpath(cache_dir())
+	
+	try:
+		cache_inode = os.stat(cache_path).st_ino
+	except OSError:
+		cache_inode = None
+	
+	def is_cache(path):
+		return os.path.realpath(path) == cache_path
+	
+	real_root = os.path.realpath(root)
+	
+	if real_root == cache_path or real_root.startswith(os.path.join(cache_path, '')):
+		return
+	
+	if is_match(root):
+		yield root
+		
+		return
+	
+	stack = [root]
+	
+	while stack:
+		path = stack.pop()
+		
+		try:
+			with os.scandir(path) as entries:
+				# Comparing the inode first avoids resolving the path of every directory.
+				dirs = [i.path for i in entries if i.is_dir(follow_symlinks = False) and not (i.inode() == cache_inode and is_cache(i.path))]
+		except OSError:
+			continue
+		
+		for i in sorted(dirs, reverse = True):
+			if is_match(i):
+				yield i
+			else:
+				stack.append(i)
+
+
+def inspect_virtualenv(path):
+	"""
+	Return a dict describing the virtualenv at the specified path. No interpreter is started.
+	"""
+	
+	virtualenv = Virtualenv(path)
+	settings = virtualenv.pyvenv_cfg or { }
+	
+	try:
+		problems = virtualenv.health_problems()
+		interpreter = os.path.realpath(virtualenv.python_path) if os.path.exists(virtualenv.python_path) else None
+		
+		return dict(
+			path = path,
+			interpreter = interpreter,
+			implementation = settings.get('implementation', 'CPython'),
+			version = settings.get('version') or settings.get('version_info'),
+			healthy = not problems,
+			problems = problems,
+			size = tree_size(path))
+	except OSError as e:
+		return dict(path = path, error = str(e))
+
+
+def scan_tree(root, jobs : int = None):
+	"""
+	Print a JSON object describing each virtualenv below root on a separate line. The virtualenvs are inspected in parallel while the tree is being searched, and each line is printed as soon as the virtualenv has been inspected.
+	"""
+	
+	if not os.path.isdir(root):
+		raise UserError('{} is not a directory.', root)
+	
+	def print_result(future):
+		print(json.dumps(future.result(), sort_keys = True))
+		sys.stdout.flush()
+	
+	with concurrent.futures.ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+		pending = set()
+		
+		for i in find_virtualenvs(root):
+			pending.add(executor.submit(inspect_virtualenv, i))
+			done = { j for j in pending if j.done() }
+			
+			for j in done:
+				print_result(j)
+			
+			pending -= done
+		
+		for i in concurrent.futures.as_completed(pending):
+			print_result(i)
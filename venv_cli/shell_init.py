@@ -0,0 +1,37 @@
+# A shell function which replaces the venv command in an interactive shell. Existing virtualenvs are activated in the current shell without running the venv command. For everything else, the venv command is run and writes the commands which activate the virtualenv to file descriptor 3, which are then evaluated in the current shell.
+_shell_function = r'''
+venv() {
+	local venv_cli_path venv_cli_script
+
+	if [ "$1" = exec ]; then
+		command venv "$@"
+
+		return
+	fi
+
+	if [ $# -le 1 ] && [ "${1:0:1}" != - ]; then
+		venv_cli_path=${1:-venv}
+
+		if [ -f "$venv_cli_path/bin/activate" ] && [ -f "$venv_cli_path/bin/python" ]; then
+			if declare -F deactivate > /dev/null; then
+				deactivate
+			fi
+
+			. "$venv_cli_path/bin/activate"
+
+			# Like Virtualenv.mark_used(), without starting Python.
+			{ : > "$venv_cli_path/venv_cli_last_used~venv_cli_partial" && command mv -f "$venv_cli_path/venv_cli_last_used~venv_cli_partial" "$venv_cli_path/venv_cli_last_used"; } 2> /dev/null || true
+
+			return
+		fi
+	fi
+
+	{ venv_cli_script=$(command venv --activate-fd 3 "$@" 3>&1 1>&4 4>&-); } 4>&1 || return
+
+	eval "$venv_cli_script"
+}
+'''
+
+
+def print_shell_init():
+	print(_shell_function.strip())
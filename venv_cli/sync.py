@@ -0,0 +1,63 @@
+import os, glob, json, hashlib
+
+from . import __version__, log, span
+from .cache import read_json, write_json
+
+
+def _fingerprint_path(virtualenv):
+	return os.path.join(virtualenv.path, 'venv_cli_fingerprint.json')
+
+
+def _hash(data):
+	return hashlib.sha256(json.dumps(data).encode()).hexdigest()
+
+
+def _file_hash(path):
+	with open(path, 'rb') as file:
+		return hashlib.sha256(file.read()).hexdigest()
+
+
+def compute_fingerprint(python : str):
+	"""
+	Return a fingerprint of the inputs of --setup for the project in the current directory. `base' changes when the virtualenv needs to be recreated, `dependencies' when the project and its dependencies need to be reinstalled.
+	"""
+	
+	from .templates import interpreter_info
+	
+	input_paths = [i for i in ['setup.py'] + sorted(glob.glob('requirements*.txt')) if os.path.isfile(i)]
+	
+	return dict(
+		python = python,
+		base = _hash([interpreter_info(python), __version__]),
+		dependencies = _hash([os.getcwd()] + [(i, _file_hash(i)) for i in input_paths]))
+
+
+def write_fingerprint(virtualenv, python : str, fingerprint : dict = None):
+	write_json(_fingerprint_path(virtualenv), fingerprint or compute_fingerprint(python))
+
+
+def sync_virtualenv(virtualenv, python : str, create, find_links : list = [], jobs : int = None):
+	"""
+	Bring the virtualenv up to date with the project in the current directory, doing as little work as possible.
+	
+	If python is None, the interpreter recorded in the fingerprint is used. create is called with the interpreter when the virtualenv needs to be recreated and set up from scratch.
+	"""
+	
+	recorded = read_json(_fingerprint_path(virtualenv)) if virtualenv.is_virtualenv else None
+	
+	if python is None:
+		python = recorded['python'] if recorded else 'python'
+	
+	with span('fingerprint'):
+		current = compute_fingerprint(python)
+	
+	if recorded == current:
+		log('{} is up to date.', virtualenv.path)
+	elif recorded is not None and recorded.get('base') == current['base']:
+		log('Dependencies of {} have changed, reinstalling them.', virtualenv.path)
+		
+		# The fingerprint is only updated after setting up succeeded, so that a failure is retried on the next invocation.
+		virtualenv.setup_project(find_links, jobs)
+		write_fingerprint(virtualenv, python, current)
+	else:
+		create(python)
@@ -0,0 +1,153 @@
+import sys, asyncio, threading, contextlib
+
+from . import CommandError, CommandResult
+
+
+# Number of seconds a process is given to exit after it has been asked to terminate, before it is killed.
+_terminate_timeout = 5
+
+
+async def _forward_lines(stream, prefix : str, file):
+	"""
+	Write the output read from stream to file line by line as soon as each line is complete, prefixing each line.
+	"""
+	
+	prefix = '[{}] '.format(prefix).encode()
+	pending = b''
+	
+	while True:
+		data = await stream.read(1 << 16)
+		
+		if not data:
+			break
+		
+		lines = (pending + data).split(b'\n')
+		pending = lines.pop()
+		
+		if lines:
+			file.buffer.write(b''.join(prefix + i + b'\n' for i in lines))
+			file.buffer.flush()
+	
+	if pending:
+		file.buffer.write(prefix + pending + b'\n')
+		file.buffer.flush()
+
+
+async def _terminate(process):
+	try:
+		process.terminate()
+	except ProcessLookupError:
+		return
+	
+	try:
+		await asyncio.wait_for(process.wait(), _terminate_timeout)
+	except asyncio.TimeoutError:
+		process.kill()
+		await process.wait()
+
+
+async def run_command(*args, use_stdout = False, use_stderr = False, prefix : str = None):
+	"""
+	Run a command and return its captured output. Raises CommandError, if the command fails.
+	
+	Output which is not captured is passed through or, if prefix is specified, written line by line as soon as each line is complete, prefixed with `[prefix]', so that the output of steps which run at the same time can be told apart. If the task is cancelled, the process is terminated.
+	"""
+	
+	def stream_mode(capture):
+		return asyncio.subprocess.PIPE if capture or prefix is not None else None
+	
+	process = await asyncio.create_subprocess_exec(*args, stdout = stream_mode(use_stdout), stderr = stream_mode(use_stderr), close_fds = False)
+	
+	async def read(stream, capture, file):
+		if stream is None:
+			return None
+		elif capture:
+			return await stream.read()
+		else:
+			await _forward_lines(stream, prefix, file)
+			
+			return None
+	
+	try:
+		stdout, stderr, _ = await asyncio.gather(read(process.stdout, use_stdout, sys.stdout), read(process.stderr, use_stderr, sys.stderr), process.wait())
+	except BaseException:
+		if process.returncode is None:
+			await _terminate(process)
+		
+		raise
+	
+	result = CommandResult(stdout, stderr)
+	
+	if process.returncode:
+		raise CommandError(args, result)
+	
+	return result
+
+
+async def gather(*awaitables):
+	"""
+	Like asyncio.gather() but if one of the awaitables fails, the others are cancelled and awaited before the exception is raised, so that no process is left running.
+	"""
+	
+	tasks = [asyncio.ensure_future(i) for i in awaitables]
+	
+	try:
+		return await asyncio.gather(*tasks)
+	except BaseException:
+		for i in tasks:
+			i.cancel()
+		
+		await asyncio.gather(*tasks, return_exceptions = True)
+		
+		raise
+
+
+async def call_in_thread(function, *args):
+	"""
+	Call a blocking function in a separate thread, so that it can run at the same time as other tasks.
+	"""
+	
+	return await asyncio.get_event_loop().run_in_executor(None, function, *args)
+
+
+def run(coroutine):
+	"""
+	Run a coroutine in a new event loop and return its result. On Ctrl-C, the remaining tasks are cancelled, which terminates their processes, before KeyboardInterrupt is raised.
+	"""
+	
+	return asyncio.run(coroutine)
+
+
+@contextlib.contextmanager
+def in_background(coroutine):
+	"""
+	Run a coroutine in a separate thread with its own event loop while the context is active. When the context is left normally, this waits for the coroutine to finish and raises its exception, if it failed. Otherwise, the coroutine is cancelled and awaited, which terminates its processes.
+	"""
+	
+	loop = asyncio.new_event_loop()
+	task = loop.create_task(coroutine)
+	
+	def run_task():
+		try:
+			loop.run_until_complete(asyncio.wait([task]))
+		finally:
+			loop.close()
+	
+	thread = threading.Thread(target = run_task)
+	thread.start()
+	
+	try:
+		yield
+	except BaseException:
+		with contextlib.suppress(RuntimeError):
+			# Fails if the loop has already been closed.
+			loop.call_soon_threadsafe(task.cancel)
+		
+		thread.join()
+		
+		raise
+	
+	thread.join()
+	
+	if not task.cancelled() and task.exception() is not None:
+		raise task.exception()
@@ -0,0 +1,109 @@
+import os, sys, shutil
+
+from . import Virtualenv, command
+from .cache import DirectoryCache, cache_dir, parse_size, memoize_for_file
+from .relocate import find_references, clone_tree
+
+
+# Prompt used when creating a template. It is replaced with the actual prompt in the copies. It contains a character which needs to be quoted in shell scripts, so that rewrite_file() can tell whether it has been written quoted.
+prompt_placeholder = 'venv-cli-template-prompt~'
+
+
+def template_cache():
+	return DirectoryCache(cache_dir('templates'), parse_size(os.environ.get('VENV_CLI_CACHE_SIZE', '512M')))
+
+
+def _is_python_script(path):
+	"""
+	Return whether the file at the specified path is a script run by a Python interpreter, as opposed to e.g. a pyenv shim, which may run a different program each time.
+	"""
+	
+	with open(path, 'rb') as file:
+		first_line = file.readline()
+	
+	return first_line.startswith(b'#!') and b'python' in first_line
+
+
+def interpreter_info(python : str):
+	"""
+	Return the path to the actual executable and the version string of the specified interpreter or None, if the interpreter cannot be run.
+	"""
+	
+	executable = shutil.which(python)
+	
+	if executable is None:
+		return None
+	
+	try:
+		result = command(executable, '-c', 'import sys; print(sys.executable); print(sys.version)', use_stdout = True, use_stderr = True)
+	except Exception:
+		return None
+	
+	executable, version = result.stdout.decode().strip().split('\n', 1)
+	
+	return os.path.realpath(executable), ' '.join(version.split())
+
+
+def is_running_interpreter(info):
+	"""
+	Return whether the interpreter described by the result of interpreter_info() is the one running this program.
+	"""
+	
+	return info is not None and tuple(info) == (os.path.realpath(sys.executable), ' '.join(sys.version.split()))
+
+
+def virtualenv_version(executable):
+	def compute():
+		return command(executable, '--version', use_stdout = True).stdout.decode().strip()
+	
+	if _is_python_script(executable):
+		return memoize_for_file(executable, 'virtualenv_version', compute)
+	else:
+		return compute()
+
+
+def _build_template(path, engine, executable, description):
+	venv_path = os.path.join(path, 'venv')
+	
+	engine.create(venv_path, executable, prompt_placeholder)
+	
+	return dict(
+		origin = venv_path,
+		references = find_references(venv_path, [venv_path, prompt_placeholder]),
+		description = description)
+
+
+def create_from_template(path, python : str, prompt : str, engine):
+	"""
+	Create a virtualenv at the specified path by copying a cached template, which is created first using the specified engine if necessary.
+	
+	Returns False without doing anything, if no template can be used for the specified interpreter. The caller should then use the engine itself, which will also report the actual error.
+	"""
+	
+	engine_version = engine.version()
+	info = interpreter_info(python)
+	
+	if engine_version is None or info is None:
+		return False
+	
+	executable, version = info
+	cache = template_cache()
+	key = cache.key_for(executable, version, engine.name, engine_version)
+	entry = cache.lookup(key)
+	
+	# E.g. the template has been removed by a tool which cleans up virtualenvs.
+	if entry is not None and not Virtualenv(os.path.join(entry.path, 'venv')).is_virtualenv:
+		cache.remove(entry)
+		entry = None
+	
+	if entry is None:
+		description = '{} ({}), {}'.format(executable, version.split()[0], engine_version)
+		entry = cache.store(key, lambda x: _build_template(x, engine, executable, description))
+	
+	replacements = [
+		(entry.metadata['origin'], os.path.abspath(path)),
+		(prompt_placeholder, prompt)]
+	
+	clone_tree(os.path.join(entry.path, 'venv'), path, replacements, entry.metadata['references'], allow_hardlinks = True)
+	
+	return True
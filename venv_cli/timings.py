@@ -0,0 +1,129 @@
+import os, time, math, threading, contextlib, collections
+
+from . import log
+from .cache import cache_dir
+
+
+# Only this many of the most recent invocations are kept in the history.
+_history_size = 1000
+
+
+class Timings:
+	"""
+	Records the durations of the phases of a single invocation. Phases may be nested and may be recorded from multiple threads, in which case the phases of each thread are nested independently.
+	"""
+	
+	def __init__(self, report : bool = False):
+		self.report = report
+		self.start = time.time()
+		self.spans = []
+		self._lock = threading.Lock()
+		self._local = threading.local()
+		self._start_counter = time.perf_counter()
+	
+	@contextlib.contextmanager
+	def span(self, name):
+		stack = self._local.__dict__.setdefault('stack', [])
+		
+		# Spans are recorded in the order in which they are entered, so that nested spans follow their parent.
+		entry = [name, len(stack), time.perf_counter() - self._start_counter, None]
+		
+		with self._lock:
+			self.spans.append(entry)
+		
+		stack.append(entry)
+		
+		try:
+			yield
+		finally:
+			stack.pop()
+			entry[3] = time.perf_counter() - self._start_counter - entry[2]
+	
+	@property
+	def duration(self):
+		return time.perf_counter() - self._start_counter
+	
+	def finish(self, argv : list, status : int):
+		"""
+		Print the recorded phases, if requested, and add them to the history.
+		"""
+		
+		duration = self.duration
+		
+		# Spans which have not been left yet, e.g. because the process is about to be replaced by a shell, last until now.
+		spans = [(name, depth, start, duration - start if length is None else length) for name, depth, start, length in self.spans]
+		
+		if self.report:
+			for name, depth, start, length in spans:
+				log('{:<32} {:8.3f} s', '  ' * depth + name, length)
+			
+			log('{:<32} {:8.3f} s', 'total', duration)
+		
+		try:
+			with _open_history() as connection, connection:
+				cursor = connection.execute('insert into invocations (time, argv, status, duration) values (?, ?, ?, ?)', (self.start, ' '.join(argv), status, duration))
+				connection.executemany('insert into spans (invocation, name, depth, start, duration) values (?, ?, ?, ?, ?)', [(cursor.lastrowid,) + i for i in spans])
+				connection.execute('delete from invocations where id <= ?', (cursor.lastrowid - _history_size,))
+				connection.execute('delete from spans where invocation <= ?', (cursor.lastrowid - _history_size,))
+		except Exception as e:
+			# The history is not essential, failing to record it should not fail the invocation.
+			log('Warning: Recording the timings in {} failed: {}', history_path(), e)
+
+
+def history_path():
+	return cache_dir('history.sqlite3')
+
+
+@contextlib.contextmanager
+def _open_history():
+	import sqlite3
+	
+	path = history_path()
+	os.makedirs(os.path.dirname(path), exist_ok = True)
+	
+	# Wait for other processes which are recording their timings at the same time.
+	connection = sqlite3.connect(path, timeout = 10)
+	connection.execute('create table if not exists invocations (id integer primary key, time real, argv text, status integer, duration real)')
+	connection.execute('create table if not exists spans (invocation integer, name text, depth integer, start real, duration real)')
+	
+	try:
+		yield connection
+	finally:
+		connection.close()
+
+
+def percentile(values : list, fraction : float):
+	"""
+	Return the specified percentile of values using the nearest-rank method.
+	"""
+	
+	values = sorted(values)
+	
+	return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def phase_stats():
+	"""
+	Return a list of tuples of phase name, number of recorded durations and their median and 95th percentile, ordered by the first time each phase was recorded.
+	"""
+	
+	if not os.path.exists(history_path()):
+		return []
+	
+	durations = collections.OrderedDict()
+	
+	with _open_history() as connection:
+		for name, duration in connection.execute('select name, duration from spans order by invocation, start'):
+			durations.setdefault(name, []).append(duration)
+	
+	return [(name, len(values), percentile(values, 0.5), percentile(values, 0.95)) for name, values in durations.items()]
+
+
+def print_stats():
+	stats = phase_stats()
+	
+	if not stats:
+		log('No timings have been recorded yet.')
+	
+	for name, count, p50, p95 in stats:
+		print('{:<24} {:6} runs  p50 {:8.3f} s  p95 {:8.3f} s'.format(name, count, p50, p95))
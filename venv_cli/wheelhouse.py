@@ -0,0 +1,188 @@
+import os, re, sys, glob, asyncio, tempfile
+
+from . import UserError, CommandError, command, log, span
+from .cache import cache_dir
+from .tasks import gather, in_background, run, run_command
+
+
+def wheelhouse_dir():
+	return cache_dir('wheelhouse')
+
+
+def read_requirements_file(path):
+	"""
+	Return the requirements listed in a pip requirements file. Nested requirements files are read recursively, other options are ignored.
+	"""
+	
+	requirements = []
+	
+	with open(path, 'r', encoding = 'utf-8') as file:
+		for line in file:
+			line = line.split(' #', 1)[0].strip()
+			
+			if not line or line.startswith('#'):
+				continue
+			
+			option, _, value = line.partition(' ')
+			
+			if option in ('-r', '--requirement'):
+				requirements.extend(read_requirements_file(os.path.join(os.path.dirname(path), value.strip())))
+			elif not line.startswith('-'):
+				requirements.append(line)
+	
+	return requirements
+
+
+def project_requirements(virtualenv):
+	"""
+	Return the requirements of the project in the current directory. These are the install_requires of setup.py and the contents of requirements.txt, if that file exists.
+	"""
+	
+	requirements = []
+	
+	if os.path.exists('setup.py'):
+		with tempfile.TemporaryDirectory() as temp_dir:
+			command(virtualenv.python_path, 'setup.py', '-q', 'egg_info', '--egg-base', temp_dir, use_stdout = True)
+			
+			for i in glob.glob(os.path.join(temp_dir, '*.egg-info', 'requires.txt')):
+				with open(i, 'r', encoding = 'utf-8') as file:
+					for line in file:
+						line = line.strip()
+						
+						# Requirements for extras follow in separate sections.
+						if line.startswith('['):
+							break
+						
+						if line:
+							requirements.append(line)
+	
+	if os.path.exists('requirements.txt'):
+		requirements.extend(read_requirements_file('requirements.txt'))
+	
+	return requirements
+
+
+async def _build_wheels(python, requirement, wheelhouse, find_links : list, quiet : bool = False):
+	"""
+	Build wheels for the requirement and its dependencies using the specified interpreter and move them into the wheelhouse. Wheels already in the wheelhouse are reused.
+	
+	The output of pip is prefixed with the requirement or, if quiet is set, discarded.
+	"""
+	
+	source_args = ['--find-links', wheelhouse]
+	
+	if find_links:
+		source_args.append('--no-index')
+		
+		for i in find_links:
+			source_args.extend(['--find-links', os.path.abspath(i)])
+	
+	# Build into a private directory so that other workers never see partially written wheels.
+	with tempfile.TemporaryDirectory(dir = wheelhouse, prefix = '.build-') as temp_dir:
+		await run_command(python, '-m', 'pip', 'wheel', '--quiet', '--wheel-dir', temp_dir, *source_args, requirement, use_stdout = quiet, use_stderr = quiet, prefix = requirement)
+		
+		for i in os.listdir(temp_dir):
+			os.replace(os.path.join(temp_dir, i), os.path.join(wheelhouse, i))
+
+
+async def _build_all_wheels(python, requirements : list, wheelhouse, find_links : list, jobs : int, quiet : bool = False):
+	"""
+	Build wheels for the requirements, at most jobs at a time. If one of the builds fails, the other builds are cancelled and a UserError is raised, unless quiet is set, in which case failures are ignored.
+	"""
+	
+	semaphore = asyncio.Semaphore(jobs or os.cpu_count())
+	
+	async def build(requirement):
+		async with semaphore:
+			try:
+				await _build_wheels(python, requirement, wheelhouse, find_links, quiet)
+			except CommandError:
+				if not quiet:
+					raise UserError('Building a wheel for requirement {} failed.', requirement)
+	
+	await gather(*(build(i) for i in requirements))
+
+
+def _install_from_wheelhouse(virtualenv, requirements, wheelhouse, quiet : bool = False):
+	"""
+	Install the requirements from wheels in the wheelhouse. If quiet is set, the output of pip is discarded.
+	"""
+	
+	command(virtualenv.python_path, '-m', 'pip', 'install', '--quiet', '--no-index', '--find-links', wheelhouse, *requirements, use_stdout = quiet, use_stderr = quiet)
+
+
+def install_dependencies(virtualenv, find_links : list = [], jobs : int = None, requirements : list = None):
+	"""
+	Install the requirements of the project in the current directory into the virtualenv. If requirements is specified, it is used instead of determining the requirements again.
+	
+	Packages are only installed from wheels in the local wheelhouse. If that fails, wheels are built for all requirements in parallel and the installation is tried again.
+	"""
+	
+	if requirements is None:
+		requirements = project_requirements(virtualenv)
+	
+	if not requirements:
+		return
+	
+	wheelhouse = wheelhouse_dir()
+	os.makedirs(wheelhouse, exist_ok = True)
+	
+	try:
+		# Fails if wheels are missing, which is expected, so the output is only shown when installing after building them.
+		_install_from_wheelhouse(virtualenv, requirements, wheelhouse, quiet = True)
+		
+		return
+	except CommandError:
+		pass
+	
+	log('Building wheels for {} requirements.', len(requirements))
+	
+	with span('build_wheels'):
+		run(_build_all_wheels(virtualenv.python_path, requirements, wheelhouse, find_links, jobs))
+	
+	try:
+		_install_from_wheelhouse(virtualenv, requirements, wheelhouse)
+	except CommandError:
+		raise UserError('Installing the dependencies failed.')
+
+
+def _has_wheel(wheelhouse, requirement):
+	"""
+	Return whether the wheelhouse contains any wheel for the project named in the requirement, regardless of its version.
+	"""
+	
+	match = re.match(r'[A-Za-z0-9][A-Za-z0-9._-]*', requirement)
+	
+	if match is None:
+		return False
+	
+	# Wheel file names use the normalized project name.
+	name = re.sub(r'[-_.]+', '_', match.group()).lower()
+	
+	return any(i.lower().startswith(name + '-') and i.endswith('.whl') for i in os.listdir(wheelhouse))
+
+
+def prebuilding_wheels(python : str, find_links : list = [], jobs : int = None):
+	"""
+	Return a context manager which builds the missing wheels for the requirements in requirements.txt in the background while the context is active, so that this can happen while the virtualenv is being created.
+	
+	This is only possible if the virtualenv is created for the interpreter running this program and pip is available to it, as the wheels are built using this interpreter. Failures are ignored, as the wheels are built again when the dependencies are installed.
+	"""
+	
+	import contextlib, importlib.util
+	from .templates import interpreter_info, is_running_interpreter
+	
+	if not os.path.exists('requirements.txt') or importlib.util.find_spec('pip') is None or not is_running_interpreter(interpreter_info(python)):
+		return contextlib.nullcontext()
+	
+	wheelhouse = wheelhouse_dir()
+	os.makedirs(wheelhouse, exist_ok = True)
+	
+	requirements = [i for i in read_requirements_file('requirements.txt') if not _has_wheel(wheelhouse, i)]
+	
+	if not requirements:
+		return contextlib.nullcontext()
+	
+	log('Building wheels for {} requirements while the virtualenv is being created.', len(requirements))
+	
+	return in_background(_build_all_wheels(sys.executable, requirements, wheelhouse, find_links, jobs, quiet = True))